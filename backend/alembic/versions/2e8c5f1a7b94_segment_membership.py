@@ -0,0 +1,32 @@
+"""Materialized segment membership
+
+Revision ID: 2e8c5f1a7b94
+Revises: 9a4b6c2d8e15
+Create Date: 2026-10-17 15:22:51.904316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e8c5f1a7b94'
+down_revision = '9a4b6c2d8e15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('segment_membership',
+    sa.Column('segment_id', sa.Integer(), nullable=False),
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['contact_id'], ['contact.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['segment_id'], ['segment.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('segment_id', 'contact_id')
+    )
+    op.create_index('ix_segment_membership_contact_id', 'segment_membership', ['contact_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_segment_membership_contact_id', table_name='segment_membership')
+    op.drop_table('segment_membership')
@@ -0,0 +1,32 @@
+"""Campaign link table for click tracking
+
+Revision ID: 4c7e2a91d5f3
+Revises: b2c68cfc865c
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c7e2a91d5f3'
+down_revision = 'b2c68cfc865c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('campaign_link',
+    sa.Column('campaign_id', sa.Integer(), nullable=False),
+    sa.Column('link_id', sa.Integer(), nullable=False),
+    sa.Column('url', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['campaign_id'], ['campaign.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('campaign_id', 'link_id')
+    )
+    op.create_index('ix_campaign_recipient_token', 'campaign_recipient', ['token'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_campaign_recipient_token', table_name='campaign_recipient')
+    op.drop_table('campaign_link')
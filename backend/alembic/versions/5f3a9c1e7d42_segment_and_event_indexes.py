@@ -0,0 +1,33 @@
+"""Segment filter and event indexes
+
+Revision ID: 5f3a9c1e7d42
+Revises: 2e8c5f1a7b94
+Create Date: 2026-10-17 17:41:08.215530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f3a9c1e7d42'
+down_revision = '2e8c5f1a7b94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_event_send_type_ts', 'event', ['email_send_id', 'type', 'ts'], unique=False)
+    op.create_index('ix_email_send_contact_id', 'email_send', ['contact_id'], unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        # matches the segment compiler's tag test, CAST(tags AS JSONB) ? 'tag'; built without locking contact
+        with op.get_context().autocommit_block():
+            op.create_index('ix_contact_tags_gin', 'contact', [sa.text('CAST(tags AS JSONB)')],
+                            postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_contact_tags_gin', table_name='contact')
+    op.drop_index('ix_email_send_contact_id', table_name='email_send')
+    op.drop_index('ix_event_send_type_ts', table_name='event')
@@ -0,0 +1,34 @@
+"""Unique email_send per (campaign, contact) for resumable sends
+
+Revision ID: 7d1f0b3e6a28
+Revises: 4c7e2a91d5f3
+Create Date: 2026-10-17 11:40:02.513877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1f0b3e6a28'
+down_revision = '4c7e2a91d5f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Collapse duplicate sends onto the earliest row, moving their events along first
+    op.execute("""
+        UPDATE event SET email_send_id = k.keep
+        FROM (SELECT id, min(id) OVER (PARTITION BY campaign_id, contact_id) AS keep FROM email_send) AS k
+        WHERE event.email_send_id = k.id AND k.id <> k.keep
+    """)
+    op.execute("""
+        DELETE FROM email_send
+        WHERE id NOT IN (SELECT min(id) FROM email_send GROUP BY campaign_id, contact_id)
+    """)
+    op.create_index('ux_email_send_campaign_contact', 'email_send', ['campaign_id', 'contact_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_email_send_campaign_contact', table_name='email_send')
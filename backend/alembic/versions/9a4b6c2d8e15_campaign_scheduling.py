@@ -0,0 +1,26 @@
+"""Campaign send window and scheduler index
+
+Revision ID: 9a4b6c2d8e15
+Revises: 7d1f0b3e6a28
+Create Date: 2026-10-17 13:05:27.640391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4b6c2d8e15'
+down_revision = '7d1f0b3e6a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('campaign', sa.Column('send_window', sa.Integer(), nullable=True))
+    op.create_index('ix_campaign_status_send_at', 'campaign', ['status', 'send_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_campaign_status_send_at', table_name='campaign')
+    op.drop_column('campaign', 'send_window')
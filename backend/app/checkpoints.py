@@ -0,0 +1,40 @@
+# Per-campaign send checkpoints in Redis. Each send_batch job covers one chunk,
+# ascending contact ids of one bulk queue shard keyed by the first id: ``chunks``
+# maps lo -> "hi@shard" and ``cursors`` maps lo -> the last contact id whose email_send rows are
+# durably written. A chunk is unfinished while its cursor is below hi, so
+# resuming a campaign reads two hashes instead of scanning email_send.
+
+def chunks_key(campaign_id: int) -> str:
+    return f"campaign:{campaign_id}:chunks"
+
+def cursors_key(campaign_id: int) -> str:
+    return f"campaign:{campaign_id}:cursors"
+
+def job_id(campaign_id: int, lo: int) -> str:
+    """Deterministic RQ job id for a chunk, so resume can see whether it is still queued."""
+    return f"send:{campaign_id}:{lo}"
+
+def reset(r, campaign_id: int):
+    r.delete(chunks_key(campaign_id), cursors_key(campaign_id))
+
+def add_chunk(r, campaign_id: int, lo: int, hi: int, shard: str = ""):
+    r.hset(chunks_key(campaign_id), lo, f"{hi}@{shard}")
+
+def advance(r, campaign_id: int, lo: int, cursor: int):
+    r.hset(cursors_key(campaign_id), lo, cursor)
+
+def unfinished(r, campaign_id: int) -> tuple[list[tuple[int, int, int, str]], int]:
+    """Return ([(lo, hi, cursor, shard)] for chunks not fully written, highest hi ever enqueued)."""
+    pipe = r.pipeline(transaction=False)
+    pipe.hgetall(chunks_key(campaign_id))
+    pipe.hgetall(cursors_key(campaign_id))
+    chunks, cursors = pipe.execute()
+    out, top = [], 0
+    for lo, value in chunks.items():
+        hi, _, shard = value.decode().partition("@")
+        lo, hi = int(lo), int(hi)
+        cursor = int(cursors.get(str(lo).encode(), lo - 1))
+        top = max(top, hi)
+        if cursor < hi:
+            out.append((lo, hi, cursor, shard))
+    return sorted(out), top
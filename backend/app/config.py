@@ -7,6 +7,7 @@ class Settings(BaseModel):
     secret_key: str = os.getenv("SECRET_KEY", "dev")
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "43200"))
     web_origin: str = os.getenv("WEB_ORIGIN", "*")
+    api_origin: str = os.getenv("API_ORIGIN", "http://localhost:8000")
     email_provider: str = os.getenv("EMAIL_PROVIDER", "ses")
     aws_region: str = os.getenv("AWS_REGION", "ap-southeast-1")
     smtp_host: str = os.getenv("SMTP_HOST", "")
@@ -14,5 +15,26 @@ class Settings(BaseModel):
     smtp_user: str = os.getenv("SMTP_USER", "")
     smtp_pass: str = os.getenv("SMTP_PASS", "")
     smtp_from: str = os.getenv("SMTP_FROM", "No Reply <no-reply@example.com>")
+    email_from: str = os.getenv("EMAIL_FROM", os.getenv("SMTP_FROM", "No Reply <no-reply@example.com>"))
+    ses_template_max: int = int(os.getenv("SES_TEMPLATE_MAX", "200"))  # bulk-send templates kept in the SES account
+    webhook_secret: str = os.getenv("WEBHOOK_SECRET", "")  # X-Webhook-Secret header or ?token= on /webhooks/provider/*
+    sns_topic_arns: str = os.getenv("SNS_TOPIC_ARNS", "")  # comma-separated topics whose signed messages are accepted
+    rate_limits: str = os.getenv("RATE_LIMITS", "")  # e.g. "ses=14,ses:gmail.com=5" (msgs/sec)
+    smtp_pool_size: int = int(os.getenv("SMTP_POOL_SIZE", "2"))
+    smtp_max_messages: int = int(os.getenv("SMTP_MAX_MESSAGES", "100"))
+    smtp_idle_timeout: float = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+    send_batch_size: int = int(os.getenv("SEND_BATCH_SIZE", "500"))
+    bulk_shards: str = os.getenv("BULK_SHARDS", "gmail.com,yahoo.com,outlook.com,hotmail.com")  # own bulk queue each
+    worker_queues: str = os.getenv("WORKER_QUEUES", "")  # comma-separated; default is every queue by priority
+    segment_max_age: float = float(os.getenv("SEGMENT_MAX_AGE_S", "86400"))  # materialized membership trusted this long
+    segment_count_ttl: int = int(os.getenv("SEGMENT_COUNT_TTL_S", "30"))
+    segment_bitmap_index: bool = os.getenv("SEGMENT_BITMAP_INDEX", "") not in ("", "0", "false")  # in-process tag/attribute index
+    segment_bitmap_refresh: float = float(os.getenv("SEGMENT_BITMAP_REFRESH_S", "600"))
+    import_dir: str = os.getenv("IMPORT_DIR", "/tmp/mauticx-imports")  # spooled uploads and error reports; shared with workers
+    import_timeout: int = int(os.getenv("IMPORT_TIMEOUT_S", "21600"))
+    scheduler_refresh: float = float(os.getenv("SCHEDULER_REFRESH_S", "30"))
+    mjml_pool_size: int = int(os.getenv("MJML_POOL_SIZE", "2"))
+    mjml_timeout: float = float(os.getenv("MJML_TIMEOUT", "10"))
+    mjml_renderer_cmd: str = os.getenv("MJML_RENDERER_CMD", "")
 
 settings = Settings()
\ No newline at end of file
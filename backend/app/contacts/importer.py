@@ -0,0 +1,148 @@
+"""Set-based contact import.
+
+Rows are processed CHUNK_ROWS at a time: one ``WHERE email IN (...)`` query
+finds the contacts that already exist, new ones go in with a single executemany
+INSERT, and existing ones are handled per ``on_duplicate``:
+
+    skip        leave them untouched
+    update      merge the row's attributes over theirs, replace tags if the row has any
+    merge_tags  add the row's tags, keep everything else
+
+Each chunk commits on its own, so memory stays flat and the session never holds
+more than one chunk. Rows repeating an email within the file fold into the first.
+Every column other than ``email`` and ``tags`` (comma-separated) is stored as a
+contact attribute under its header name.
+"""
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..models import Contact
+from ..segments import membership
+
+ON_DUPLICATE = ("skip", "update", "merge_tags")
+CHUNK_ROWS = 2000
+RESERVED_COLUMNS = ("email", "tags")
+MAX_ERRORS = 100  # messages kept; error_count keeps counting
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    error_count: int = 0
+    errors: list[str] = field(default_factory=list)
+    report: object = field(default=None, repr=False)  # csv.writer receiving every (row, error)
+
+    def error(self, line: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"Row {line}: {message}")
+        if self.report is not None:
+            self.report.writerow([line, message])
+
+def _clean(value) -> str | None:
+    if value is None or value != value:  # NaN from spreadsheet readers
+        return None
+    value = str(value).strip()
+    return value or None
+
+def parse_row(row: dict) -> dict:
+    """{"email", "attributes", "tags"} from a file row; raises ValueError if it has no email."""
+    email = _clean(row.get("email"))
+    if not email:
+        raise ValueError("Email is required")
+    attributes = {str(k): v for k, raw in row.items()
+                  if k and k not in RESERVED_COLUMNS and (v := _clean(raw)) is not None}
+    tags = [t.strip() for t in (_clean(row.get("tags")) or "").split(",") if t.strip()]
+    return {"email": email, "attributes": attributes, "tags": tags}
+
+def _fold(into: dict, row: dict):
+    into["attributes"].update(row["attributes"])
+    into["tags"] += [t for t in row["tags"] if t not in into["tags"]]
+
+def _merged(existing_attrs: dict, existing_tags: list, row: dict, on_duplicate: str) -> tuple[dict, list]:
+    attributes, tags = dict(existing_attrs or {}), list(existing_tags or [])
+    if on_duplicate == "update":
+        attributes.update(row["attributes"])
+        if row["tags"]:
+            tags = row["tags"]
+    else:  # merge_tags
+        tags += [t for t in row["tags"] if t not in tags]
+    return attributes, tags
+
+def _insert_contacts(dialect: str):
+    # contacts created concurrently by another import are left alone and not returned
+    for name, mod in (("postgresql", postgresql), ("sqlite", sqlite)):
+        if dialect == name:
+            return mod.insert(Contact).on_conflict_do_nothing(index_elements=["email"]).returning(Contact.id)
+    return insert(Contact).returning(Contact.id)
+
+def import_chunk(db: Session, rows: list[tuple[int, dict]], on_duplicate: str, stats: ImportStats):
+    """Import (line number, raw row) pairs in one round of set-based statements and commit."""
+    stats.rows += len(rows)
+    pending: dict[str, dict] = {}
+    for line, raw in rows:
+        try:
+            row = parse_row(raw)
+        except ValueError as e:
+            stats.error(line, str(e))
+            continue
+        if row["email"] in pending:
+            _fold(pending[row["email"]], row)
+            stats.skipped += 1
+        else:
+            pending[row["email"]] = row
+    if not pending:
+        return
+
+    existing = db.execute(
+        select(Contact.id, Contact.email, Contact.attributes, Contact.tags).where(Contact.email.in_(pending))
+    ).all()
+    changes = []
+    for cid, email, attributes, tags in existing:
+        row = pending.pop(email)
+        if on_duplicate == "skip":
+            stats.skipped += 1
+            continue
+        new_attributes, new_tags = _merged(attributes, tags, row, on_duplicate)
+        if new_attributes == (attributes or {}) and new_tags == (tags or []):
+            stats.skipped += 1
+            continue
+        changes.append({"id": cid, "attributes": new_attributes, "tags": new_tags})
+
+    created = []
+    if pending:
+        created = db.execute(_insert_contacts(db.get_bind().dialect.name), list(pending.values())).scalars().all()
+        stats.skipped += len(pending) - len(created)
+    if changes:
+        db.execute(update(Contact), changes)
+    db.commit()
+    stats.created += len(created)
+    stats.updated += len(changes)
+
+    membership.refresh_contacts(db, created)
+    membership.refresh_contacts(db, [c["id"] for c in changes], {"attributes", "tags"})
+
+def chunks(rows: Iterable, size: int | None = None) -> Iterator[list]:
+    it = iter(rows)
+    while chunk := list(islice(it, size or CHUNK_ROWS)):
+        yield chunk
+
+def import_rows(db: Session, rows: Iterable[tuple[int, dict]], on_duplicate: str = "skip",
+                stats: ImportStats | None = None, on_chunk: Callable[[ImportStats], None] | None = None) -> ImportStats:
+    """Import (line number, raw row) pairs chunk by chunk; raises ValueError for an unknown on_duplicate.
+
+    ``on_chunk`` runs with the running totals after each chunk commits.
+    """
+    if on_duplicate not in ON_DUPLICATE:
+        raise ValueError(f"on_duplicate must be one of {', '.join(ON_DUPLICATE)}")
+    stats = ImportStats() if stats is None else stats
+    for chunk in chunks(rows):
+        import_chunk(db, chunk, on_duplicate, stats)
+        if on_chunk:
+            on_chunk(stats)
+    return stats
@@ -0,0 +1,132 @@
+"""Background contact imports for large CSV/XLSX files.
+
+``start_import`` spools the upload to IMPORT_DIR (shared by the API and the
+workers), records the import in a Redis hash and queues ``run_import`` on the
+``imports`` queue. The job streams rows from disk (the csv module, or openpyxl in
+read-only mode for XLSX) into ``importer.import_rows``, updates the hash after
+every chunk, and writes every rejected row to ``<id>.errors.csv`` next to the
+spooled file, which is deleted when the job ends. ``read`` turns the hash into
+the status the API returns, including rows per second.
+"""
+import csv, os, shutil, time, uuid
+from functools import partial
+from typing import BinaryIO, Iterator
+from .. import queues
+from ..config import settings
+from ..db import SessionLocal
+from ..tasks import redis
+from . import importer
+
+EXTENSIONS = (".csv", ".xlsx")
+RUN_IMPORT = "app.contacts.imports.run_import"
+COUNTERS = ("rows", "created", "updated", "skipped", "error_count")
+IMPORT_TTL = 7 * 24 * 3600  # status hashes and error reports are kept this long
+SPOOL_CHUNK = 1024 * 1024
+
+def import_key(import_id: str) -> str:
+    return f"contact_import:{import_id}"
+
+def report_path(import_id: str) -> str:
+    return os.path.join(settings.import_dir, f"{import_id}.errors.csv")
+
+def extension(filename: str) -> str | None:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if ext in EXTENSIONS else None
+
+def spool(fileobj: BinaryIO, name: str) -> str:
+    """Copy an upload to IMPORT_DIR in fixed-size chunks; returns the path."""
+    os.makedirs(settings.import_dir, exist_ok=True)
+    path = os.path.join(settings.import_dir, name)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(fileobj, out, SPOOL_CHUNK)
+    return path
+
+def _sweep():
+    # drop spooled files and reports older than the status hashes that point at them
+    cutoff = time.time() - IMPORT_TTL
+    for entry in os.scandir(settings.import_dir):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+
+def _records(rows: Iterator) -> Iterator[tuple[int, dict]]:
+    header = [str(c).strip() if c is not None else "" for c in next(rows, ())]
+    header = [h.lower() if h.lower() in importer.RESERVED_COLUMNS else h for h in header]
+    if "email" not in header:
+        raise ValueError("Missing required columns: ['email']")
+    for line, cells in enumerate(rows, start=2):
+        if any(c not in (None, "") for c in cells):  # blank lines are not rows
+            yield line, {h: c for h, c in zip(header, cells) if h}
+
+def read_rows(path: str) -> Iterator[tuple[int, dict]]:
+    """(row number, {header: value}) for each data row, streamed from a CSV or XLSX file.
+
+    Raises ValueError if the file has no email column or is not valid UTF-8.
+    """
+    if path.endswith(".xlsx"):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from _records(wb.active.iter_rows(values_only=True))
+        finally:
+            wb.close()
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from _records(iter(csv.reader(f)))
+
+def start_import(r, fileobj: BinaryIO, filename: str, on_duplicate: str = "skip") -> str:
+    """Spool an upload and queue its import; returns the import id."""
+    import_id = uuid.uuid4().hex
+    path = spool(fileobj, import_id + extension(filename))
+    _sweep()
+    key = import_key(import_id)
+    r.hset(key, mapping={
+        "state": "queued", "filename": filename, "on_duplicate": on_duplicate, "path": path,
+        "bytes": os.path.getsize(path), "queued_at": time.time(), **{c: 0 for c in COUNTERS},
+    })
+    r.expire(key, IMPORT_TTL)
+    queues.get_queue(queues.IMPORTS).enqueue(RUN_IMPORT, import_id, job_id=f"import:{import_id}",
+                                             job_timeout=settings.import_timeout)
+    return import_id
+
+def _record(r, key: str, stats: importer.ImportStats, out=None):
+    if out is not None:
+        out.flush()  # the partial report is downloadable while the import runs
+    r.hset(key, mapping={c: getattr(stats, c) for c in COUNTERS})
+
+def run_import(import_id: str):
+    """RQ job: import a spooled file, keeping its status hash current."""
+    key = import_key(import_id)
+    meta = {k.decode(): v.decode() for k, v in redis.hgetall(key).items()}
+    if not meta:
+        return
+    redis.hset(key, mapping={"state": "running", "started_at": time.time()})
+    try:
+        with open(report_path(import_id), "w", newline="") as out, SessionLocal() as db:
+            report = csv.writer(out)
+            report.writerow(["row", "error"])
+            stats = importer.ImportStats(report=report)
+            importer.import_rows(db, read_rows(meta["path"]), meta["on_duplicate"], stats=stats,
+                                 on_chunk=partial(_record, redis, key, out=out))
+        _record(redis, key, stats)
+        redis.hset(key, mapping={"state": "done", "finished_at": time.time()})
+    except Exception as e:
+        redis.hset(key, mapping={"state": "failed", "error": str(e), "finished_at": time.time()})
+        raise
+    finally:
+        if os.path.exists(meta["path"]):
+            os.remove(meta["path"])
+        redis.expire(key, IMPORT_TTL)
+
+def read(r, import_id: str) -> dict | None:
+    raw = {k.decode(): v.decode() for k, v in r.hgetall(import_key(import_id)).items()}
+    if not raw:
+        return None
+    out = {"id": import_id, "state": raw.get("state"), "filename": raw.get("filename"),
+           "on_duplicate": raw.get("on_duplicate"), "bytes": int(raw.get("bytes", 0)),
+           **{c: int(raw.get(c, 0)) for c in COUNTERS}}
+    started, finished = float(raw.get("started_at", 0)), float(raw.get("finished_at", 0))
+    elapsed = (finished or time.time()) - started if started else 0
+    out["rows_per_sec"] = round(out["rows"] / elapsed, 1) if elapsed > 0 else 0.0
+    if raw.get("error"):
+        out["error"] = raw["error"]
+    return out
@@ -1,5 +1,54 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, replace
+from typing import Iterable
+from ..templating.compiled import compile_template
+
+@dataclass
+class Message:
+    to_email: str
+    subject: str
+    html: str
+    text: str | None = None
+    # When set, subject/html/text are an unrendered template shared by the batch and
+    # this is the recipient's context; providers render it (or hand it to a bulk API).
+    template_data: dict | None = None
+
+@dataclass
+class SendResult:
+    message_id: str | None = None
+    error: str | None = None
+    throttled: bool = False  # provider pushed back on rate; safe to retry after backing off
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def personalized(m: Message) -> Message:
+    if m.template_data is None:
+        return m
+    ctx = m.template_data
+    return replace(m, subject=compile_template(m.subject).render(ctx), html=compile_template(m.html).render(ctx, escape=True),
+                   text=compile_template(m.text).render(ctx) if m.text else m.text, template_data=None)
 
 class EmailProvider(ABC):
+    name = "base"
+
     @abstractmethod
-    def send(self, to_email: str, subject: str, html: str, text: str | None = None) -> str: ...
\ No newline at end of file
+    def send(self, to_email: str, subject: str, html: str, text: str | None = None) -> str: ...
+
+    def is_throttle(self, e: Exception) -> bool:
+        return False
+
+    def failed(self, e: Exception) -> SendResult:
+        return SendResult(error=str(e), throttled=self.is_throttle(e))
+
+    def send_batch(self, messages: Iterable[Message]) -> list[SendResult]:
+        """Send many messages, one result per message in order. Providers override this with bulk paths."""
+        results = []
+        for m in messages:
+            m = personalized(m)
+            try:
+                results.append(SendResult(self.send(m.to_email, m.subject, m.html, m.text)))
+            except Exception as e:
+                results.append(self.failed(e))
+        return results
@@ -0,0 +1,20 @@
+from functools import lru_cache
+from ..config import settings
+from .base import EmailProvider
+
+@lru_cache(maxsize=None)
+def get_provider(name: str | None = None) -> EmailProvider:
+    """Process-wide provider instance for EMAIL_PROVIDER (ses|smtp|fake)."""
+    name = name or settings.email_provider
+    if name == "ses":
+        from .ses import SESEmailProvider
+        return SESEmailProvider(settings.aws_region, settings.email_from, max_templates=settings.ses_template_max)
+    if name == "smtp":
+        from .smtp import SMTPEmailProvider
+        return SMTPEmailProvider(settings.smtp_host, settings.smtp_port, settings.smtp_user, settings.smtp_pass,
+                                 settings.email_from, pool_size=settings.smtp_pool_size,
+                                 max_messages=settings.smtp_max_messages, idle_timeout=settings.smtp_idle_timeout)
+    if name == "fake":
+        from .fake import FakeEmailProvider
+        return FakeEmailProvider()
+    raise ValueError(f"unknown email provider: {name}")
@@ -0,0 +1,15 @@
+from .base import EmailProvider, Message
+
+class FakeEmailProvider(EmailProvider):
+    """Records messages in memory instead of sending them; for tests and local runs."""
+    name = "fake"
+
+    def __init__(self, fail_for: set[str] | None = None):
+        self.sent: list[Message] = []
+        self.fail_for = fail_for or set()
+
+    def send(self, to_email: str, subject: str, html: str, text: str | None = None) -> str:
+        if to_email in self.fail_for:
+            raise RuntimeError(f"fake failure for {to_email}")
+        self.sent.append(Message(to_email, subject, html, text))
+        return f"fake-{len(self.sent)}"
@@ -0,0 +1,94 @@
+import time
+
+# Token buckets live in Redis hashes and are updated by Lua scripts, so every worker
+# draws from the same budget. Time comes from Redis TIME to avoid clock skew.
+# Each bucket carries a backoff factor in (0, 1]: throttling errors cut it
+# (multiplicative decrease) and it recovers linearly over time (additive increase).
+
+ACQUIRE = """
+local rate, burst, want, recover = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local s = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'factor')
+local ts = tonumber(s[2]) or now
+local elapsed = math.max(now - ts, 0)
+local factor = math.min(1, (tonumber(s[3]) or 1) + recover * elapsed)
+local cap = math.max(burst * factor, 1)
+local tokens = math.min(cap, (tonumber(s[1]) or cap) + elapsed * rate * factor)
+local granted = math.min(want, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now), 'factor', tostring(factor))
+redis.call('EXPIRE', KEYS[1], 3600)
+local wait = 0
+if granted == 0 then wait = (1 - tokens) / (rate * factor) end
+return {granted, tostring(wait)}
+"""
+
+PENALIZE = """
+local f = math.max(tonumber(ARGV[1]), (tonumber(redis.call('HGET', KEYS[1], 'factor')) or 1) * tonumber(ARGV[2]))
+redis.call('HSET', KEYS[1], 'factor', tostring(f), 'tokens', '0')
+return tostring(f)
+"""
+
+def parse_limits(spec: str) -> dict[str, float]:
+    """``"ses=14,ses:gmail.com=5"`` -> ``{"ses": 14.0, "ses:gmail.com": 5.0}`` (messages per second)."""
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, rate = part.partition("=")
+        limits[name.strip().lower()] = float(rate)
+    return limits
+
+class TokenBucket:
+    def __init__(self, r, key: str, rate: float, burst: float | None = None,
+                 recover: float = 0.02, min_factor: float = 0.05, backoff: float = 0.5):
+        self.r, self.key, self.rate, self.burst = r, key, rate, burst or rate
+        self.recover, self.min_factor, self.backoff = recover, min_factor, backoff
+        self._acquire = r.register_script(ACQUIRE)
+        self._penalize = r.register_script(PENALIZE)
+
+    def try_acquire(self, n: int) -> tuple[int, float]:
+        """Take up to n tokens; returns (granted, seconds until the next token if none were granted)."""
+        granted, wait = self._acquire(keys=[self.key], args=[self.rate, self.burst, n, self.recover])
+        return int(granted), float(wait)
+
+    def acquire(self, n: int) -> int:
+        """Block until at least one token is available; returns how many of the n were granted."""
+        while True:
+            granted, wait = self.try_acquire(n)
+            if granted:
+                return granted
+            time.sleep(min(max(wait, 0.01), 1.0))
+
+    def refund(self, n: int):
+        if n > 0:
+            self.r.hincrbyfloat(self.key, "tokens", n)
+
+    def penalize(self) -> float:
+        return float(self._penalize(keys=[self.key], args=[self.min_factor, self.backoff]))
+
+class RateLimiter:
+    """Per-provider bucket plus optional per-(provider, recipient domain) buckets from RATE_LIMITS."""
+
+    def __init__(self, r, provider: str, limits: dict[str, float]):
+        self.r, self.provider = r, provider
+        rate = limits.get(provider)
+        self.global_bucket = TokenBucket(r, f"ratelimit:{provider}", rate) if rate else None
+        self.domains = {
+            name.split(":", 1)[1]: TokenBucket(r, f"ratelimit:{name}", rate)
+            for name, rate in limits.items() if name.startswith(f"{provider}:")
+        }
+
+    def acquire(self, domain: str, n: int) -> int:
+        domain_bucket = self.domains.get(domain.lower())
+        granted = self.global_bucket.acquire(n) if self.global_bucket else n
+        if domain_bucket:
+            allowed = domain_bucket.acquire(granted)
+            if self.global_bucket:
+                self.global_bucket.refund(granted - allowed)
+            granted = allowed
+        return granted
+
+    def penalize(self, domain: str):
+        for bucket in (self.global_bucket, self.domains.get(domain.lower())):
+            if bucket:
+                bucket.penalize()
@@ -1,13 +1,37 @@
+import json
+from functools import lru_cache
+from typing import Iterable
 import boto3
-from .base import EmailProvider
+from botocore.exceptions import ClientError
+from .base import EmailProvider, Message, SendResult
+from ..templating.compiled import compile_template, raw_placeholders
+from ..templating.render import content_hash
+
+# SES accepts at most 50 destinations per SendBulkTemplatedEmail call
+BULK_MAX = 50
+THROTTLE_CODES = {"Throttling", "ThrottlingException", "MaxSendingRateExceeded", "TooManyRequestsException"}
+# per-destination statuses of a bulk send that are worth retrying after backing off
+THROTTLE_STATUSES = {"AccountThrottled", "TransientFailure"}
+# SES caps templates per account: only this many of ours are kept, the oldest beyond it are deleted
+TEMPLATE_PREFIX = "mauticx-"
+TEMPLATE_MAX = 200
+
+@lru_cache(maxsize=None)
+def ses_client(region: str):
+    # boto3 clients are thread-safe and expensive to build; one per region per process
+    return boto3.client("ses", region_name=region)
 
 class SESEmailProvider(EmailProvider):
-    def __init__(self, region: str):
-        self.client = boto3.client("ses", region_name=region)
+    name = "ses"
+
+    def __init__(self, region: str, from_addr: str = "No Reply <no-reply@example.com>", max_templates: int = TEMPLATE_MAX):
+        self.client = ses_client(region)
+        self.from_addr, self.max_templates = from_addr, max_templates
+        self._templates: set[str] = set()
 
     def send(self, to_email: str, subject: str, html: str, text: str | None = None) -> str:
         res = self.client.send_email(
-            Source="No Reply <no-reply@example.com>",
+            Source=self.from_addr,
             Destination={"ToAddresses": [to_email]},
             Message={
                 "Subject": {"Data": subject},
@@ -15,3 +39,99 @@ class SESEmailProvider(EmailProvider):
             },
         )
         return res["MessageId"]
+
+    def is_throttle(self, e: Exception) -> bool:
+        return isinstance(e, ClientError) and (
+            e.response.get("Error", {}).get("Code") in THROTTLE_CODES
+            or "Maximum sending rate exceeded" in e.response.get("Error", {}).get("Message", ""))
+
+    def _template(self, subject: str, html: str, text: str | None) -> str:
+        # Handlebars escapes {{x}} everywhere; only the HTML part should be, as in local rendering
+        subject, text = raw_placeholders(subject), raw_placeholders(text or "")
+        name = TEMPLATE_PREFIX + content_hash("\0".join((subject, html, text)))[:40]
+        if name not in self._templates:
+            template = {"TemplateName": name, "SubjectPart": subject, "HtmlPart": html, "TextPart": text}
+            try:
+                self.client.create_template(Template=template)
+            except self.client.exceptions.AlreadyExistsException:
+                pass
+            except self.client.exceptions.LimitExceededException:
+                self.prune(self.max_templates // 2)  # make room, then try once more
+                self.client.create_template(Template=template)
+            else:
+                self.prune(self.max_templates)
+            self._templates.add(name)
+        return name
+
+    def prune(self, keep: int) -> int:
+        """Delete our templates beyond the ``keep`` most recently created; returns how many were deleted.
+
+        A campaign whose template goes while it is still sending recreates it (see ``send_batch``).
+        """
+        ours = [t for page in self.client.get_paginator("list_templates").paginate()
+                for t in page.get("TemplatesMetadata", []) if t["Name"].startswith(TEMPLATE_PREFIX)]
+        ours.sort(key=lambda t: t["CreatedTimestamp"], reverse=True)
+        for t in ours[keep:]:
+            try:
+                self.client.delete_template(TemplateName=t["Name"])
+            except ClientError:
+                pass  # another process deleted it first
+            self._templates.discard(t["Name"])
+        return len(ours[keep:])
+
+    @staticmethod
+    def _bulkable(m: Message) -> bool:
+        # SES renders {{a.b}} itself but has no notion of our {{a|default}} syntax
+        return m.template_data is not None and not any(
+            compile_template(part).has_defaults for part in (m.subject, m.html, m.text or ""))
+
+    def _send_bulk(self, name: str, messages: list[Message]) -> dict:
+        return self.client.send_bulk_templated_email(
+            Source=self.from_addr,
+            Template=name,
+            DefaultTemplateData="{}",
+            Destinations=[{
+                "Destination": {"ToAddresses": [m.to_email]},
+                "ReplacementTemplateData": json.dumps(m.template_data, default=str),
+            } for m in messages],
+        )
+
+    def send_batch(self, messages: Iterable[Message]) -> list[SendResult]:
+        """Templated messages sharing content go out via SendBulkTemplatedEmail, 50 destinations per call."""
+        messages = list(messages)
+        results: list[SendResult | None] = [None] * len(messages)
+        groups: dict[tuple, list[int]] = {}
+        singles: list[int] = []
+        for i, m in enumerate(messages):
+            if self._bulkable(m):
+                groups.setdefault((m.subject, m.html, m.text), []).append(i)
+            else:
+                singles.append(i)
+
+        for (subject, html, text), idxs in groups.items():
+            try:
+                name = self._template(subject, html, text)
+            except Exception:
+                singles.extend(idxs)  # fall back to rendering locally
+                continue
+            for start in range(0, len(idxs), BULK_MAX):
+                chunk = idxs[start:start + BULK_MAX]
+                try:
+                    try:
+                        res = self._send_bulk(name, [messages[i] for i in chunk])
+                    except self.client.exceptions.TemplateDoesNotExistException:
+                        # pruned by another process mid-campaign: create it again and retry once
+                        self._templates.discard(name)
+                        name = self._template(subject, html, text)
+                        res = self._send_bulk(name, [messages[i] for i in chunk])
+                    for i, status in zip(chunk, res["Status"]):
+                        results[i] = SendResult(status.get("MessageId")) if status.get("Status") == "Success" \
+                            else SendResult(error=status.get("Error") or status.get("Status"),
+                                            throttled=status.get("Status") in THROTTLE_STATUSES)
+                except Exception as e:
+                    for i in chunk:
+                        results[i] = self.failed(e)
+
+        for i, r in zip(singles, super().send_batch(messages[i] for i in singles)):
+            results[i] = r
+        return results
@@ -1,23 +1,150 @@
-import smtplib
+import smtplib, threading, time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from .base import EmailProvider
+from email.utils import make_msgid
+from typing import Callable, Iterable
+from .base import EmailProvider, Message, SendResult, personalized
+
+# Errors after which a session is dropped and the message retried on a fresh connection
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+# Transient "slow down" replies relays use for rate limiting
+THROTTLE_CODES = {421, 450, 451, 452}
+
+class _Session:
+    """One pooled connection; (re)opened lazily so a dead server fails a message, not the pool."""
+
+    def __init__(self, connect: Callable[[], smtplib.SMTP]):
+        self._connect = connect
+        self.smtp: smtplib.SMTP | None = None
+        self.sent, self.last_used = 0, time.monotonic()
+
+    def open(self):
+        self.drop()
+        self.smtp = self._connect()
+        self.sent = 0
+
+    def drop(self):
+        if self.smtp is not None:
+            self.smtp.close()
+            self.smtp = None
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+        self.drop()
 
 class SMTPEmailProvider(EmailProvider):
-    def __init__(self, host: str, port: int, user: str, password: str, from_addr: str):
+    """SMTP provider keeping up to ``pool_size`` authenticated sessions alive.
+
+    Sessions are reused for many messages (RSET between transactions), retired
+    after ``max_messages`` or ``idle_timeout`` seconds unused, and replaced
+    transparently when the server disconnects or answers 421.
+    """
+    name = "smtp"
+
+    def __init__(self, host: str, port: int, user: str, password: str, from_addr: str,
+                 pool_size: int = 2, max_messages: int = 100, idle_timeout: float = 60.0, timeout: float = 30.0):
         self.host, self.port, self.user, self.password, self.from_addr = host, port, user, password, from_addr
+        self.max_messages, self.idle_timeout, self.timeout = max_messages, idle_timeout, timeout
+        self._idle: list[_Session] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
 
-    def send(self, to_email: str, subject: str, html: str, text: str | None = None) -> str:
+    def _connect(self) -> smtplib.SMTP:
+        s = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.user:
+            s.starttls()
+            s.login(self.user, self.password)
+        return s
+
+    def _acquire(self) -> _Session:
+        self._slots.acquire()
+        while True:
+            with self._lock:
+                sess = self._idle.pop() if self._idle else None
+            if sess is None:
+                return _Session(self._connect)
+            if time.monotonic() - sess.last_used < self.idle_timeout:
+                return sess
+            sess.close()
+
+    def _release(self, sess: _Session):
+        if sess.smtp is not None and sess.sent < self.max_messages:
+            sess.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(sess)
+        else:
+            sess.close()
+        self._slots.release()
+
+    def _mime(self, m: Message) -> tuple[str, str]:
         msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
+        msg["Subject"] = m.subject
         msg["From"] = self.from_addr
-        msg["To"] = to_email
-        if text:
-            msg.attach(MIMEText(text, "plain"))
-        msg.attach(MIMEText(html, "html"))
-        with smtplib.SMTP(self.host, self.port) as s:
-            if self.user:
-                s.starttls()
-                s.login(self.user, self.password)
-            s.sendmail(self.from_addr, [to_email], msg.as_string())
-        return "smtp-queued"
+        msg["To"] = m.to_email
+        msg["Message-ID"] = make_msgid()
+        if m.text:
+            msg.attach(MIMEText(m.text, "plain"))
+        msg.attach(MIMEText(m.html, "html"))
+        return msg["Message-ID"], msg.as_string()
+
+    def _transact(self, sess: _Session, m: Message) -> str:
+        if sess.sent:
+            sess.smtp.rset()
+        message_id, body = self._mime(m)
+        sess.smtp.sendmail(self.from_addr, [m.to_email], body)
+        sess.sent += 1
+        return message_id
+
+    @staticmethod
+    def _is_reconnectable(e: Exception) -> bool:
+        return isinstance(e, RECONNECT_ERRORS) or (isinstance(e, smtplib.SMTPResponseException) and e.smtp_code == 421)
+
+    def is_throttle(self, e: Exception) -> bool:
+        if isinstance(e, smtplib.SMTPRecipientsRefused):
+            return any(code in THROTTLE_CODES for code, _ in e.recipients.values())
+        return isinstance(e, smtplib.SMTPResponseException) and e.smtp_code in THROTTLE_CODES
+
+    def _deliver(self, sess: _Session, m: Message) -> str:
+        if sess.smtp is None or sess.sent >= self.max_messages:
+            sess.close()
+            sess.open()
+        try:
+            return self._transact(sess, m)
+        except Exception as e:
+            if not self._is_reconnectable(e):
+                raise  # protocol-level refusal; the session itself is still good
+            sess.open()
+            return self._transact(sess, m)
+
+    def send_batch(self, messages: Iterable[Message]) -> list[SendResult]:
+        """Pipeline a batch over one pooled session, reconnecting as needed; one result per message."""
+        results = []
+        sess = self._acquire()
+        try:
+            for m in messages:
+                try:
+                    results.append(SendResult(self._deliver(sess, personalized(m))))
+                except Exception as e:
+                    results.append(self.failed(e))
+        finally:
+            self._release(sess)
+        return results
+
+    send_many = send_batch
+
+    def send(self, to_email: str, subject: str, html: str, text: str | None = None) -> str:
+        sess = self._acquire()
+        try:
+            return self._deliver(sess, Message(to_email, subject, html, text))
+        finally:
+            self._release(sess)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sess in idle:
+            sess.close()
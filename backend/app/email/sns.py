@@ -0,0 +1,61 @@
+"""Amazon SNS message verification for the provider webhook.
+
+SES delivers bounce and complaint notifications through SNS. ``verify`` checks
+a message's signature against the signing certificate SNS names (only
+certificates served over HTTPS from an ``sns.<region>.amazonaws.com`` host are
+trusted); ``confirm_subscription`` visits the SubscribeURL of a verified
+SubscriptionConfirmation so the topic starts delivering.
+"""
+import base64, re, urllib.request
+from functools import lru_cache
+from urllib.parse import urlparse
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+TYPES = ("Notification", "SubscriptionConfirmation", "UnsubscribeConfirmation")
+SNS_HOST = re.compile(r"^sns\.[a-z0-9-]+\.amazonaws\.com(\.cn)?$")
+# Fields covered by the signature, in signing order
+NOTIFICATION_FIELDS = ("Message", "MessageId", "Subject", "Timestamp", "TopicArn", "Type")
+SUBSCRIPTION_FIELDS = ("Message", "MessageId", "SubscribeURL", "Timestamp", "Token", "TopicArn", "Type")
+FETCH_TIMEOUT = 10
+
+def is_sns(payload: dict) -> bool:
+    return payload.get("Type") in TYPES and "Signature" in payload
+
+def trusted_url(url: str | None) -> bool:
+    parsed = urlparse(url or "")
+    return parsed.scheme == "https" and bool(SNS_HOST.match(parsed.hostname or ""))
+
+@lru_cache(maxsize=16)
+def _certificate(url: str) -> x509.Certificate:
+    with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as resp:
+        return x509.load_pem_x509_certificate(resp.read())
+
+def string_to_sign(payload: dict) -> str:
+    fields = NOTIFICATION_FIELDS if payload.get("Type") == "Notification" else SUBSCRIPTION_FIELDS
+    return "".join(f"{k}\n{payload[k]}\n" for k in fields if k in payload)
+
+def verify(payload: dict) -> bool:
+    """True if the message carries a valid SNS signature (SignatureVersion 1 or 2)."""
+    url = payload.get("SigningCertURL")
+    if not is_sns(payload) or not trusted_url(url) or not url.endswith(".pem"):
+        return False
+    digest = {"1": hashes.SHA1, "2": hashes.SHA256}.get(str(payload.get("SignatureVersion", "1")))
+    if digest is None:
+        return False
+    try:
+        _certificate(url).public_key().verify(
+            base64.b64decode(payload["Signature"]), string_to_sign(payload).encode(), padding.PKCS1v15(), digest()
+        )
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+def confirm_subscription(payload: dict) -> bool:
+    url = payload.get("SubscribeURL")
+    if not trusted_url(url):
+        return False
+    with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as resp:
+        return resp.status == 200
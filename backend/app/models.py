@@ -1,5 +1,5 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import Integer, BigInteger, String, Text, JSON, TIMESTAMP, ForeignKey, func
+from sqlalchemy import Integer, BigInteger, String, Text, JSON, TIMESTAMP, ForeignKey, Index, func
 from typing import Optional
 
 class Base(DeclarativeBase):
@@ -39,6 +39,11 @@ class Segment(Base):
     definition: Mapped[dict] = mapped_column(JSON) # JSON filter tree
     materialized_at: Mapped[Optional[str]] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
 
+class SegmentMembership(Base):
+    __tablename__ = "segment_membership"
+    segment_id: Mapped[int] = mapped_column(ForeignKey("segment.id", ondelete="CASCADE"), primary_key=True)
+    contact_id: Mapped[int] = mapped_column(ForeignKey("contact.id", ondelete="CASCADE"), primary_key=True, index=True)
+
 class EmailTemplate(Base):
     __tablename__ = "email_template"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -47,11 +52,14 @@ class EmailTemplate(Base):
 
 class Campaign(Base):
     __tablename__ = "campaign"
+    # the scheduler polls status = 'scheduled' ordered by send_at
+    __table_args__ = (Index("ix_campaign_status_send_at", "status", "send_at"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(128))
     template_id: Mapped[int] = mapped_column(ForeignKey("email_template.id"))
     segment_id: Mapped[int] = mapped_column(ForeignKey("segment.id"))
     send_at: Mapped[Optional[str]] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+    send_window: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # seconds to spread delivery over
     status: Mapped[str] = mapped_column(String(32), default="draft")
     custom_content: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # Custom MJML content for this campaign
 
@@ -59,10 +67,21 @@ class CampaignRecipient(Base):
     __tablename__ = "campaign_recipient"
     campaign_id: Mapped[int] = mapped_column(ForeignKey("campaign.id", ondelete="CASCADE"), primary_key=True)
     contact_id: Mapped[int] = mapped_column(ForeignKey("contact.id", ondelete="CASCADE"), primary_key=True)
-    token: Mapped[str] = mapped_column(String(36))
+    token: Mapped[str] = mapped_column(String(36), index=True)
+
+class CampaignLink(Base):
+    __tablename__ = "campaign_link"
+    campaign_id: Mapped[int] = mapped_column(ForeignKey("campaign.id", ondelete="CASCADE"), primary_key=True)
+    link_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    url: Mapped[str] = mapped_column(Text)
 
 class EmailSend(Base):
     __tablename__ = "email_send"
+    # one send per recipient: lets retried or resumed batches skip contacts already recorded
+    __table_args__ = (
+        Index("ux_email_send_campaign_contact", "campaign_id", "contact_id", unique=True),
+        Index("ix_email_send_contact_id", "contact_id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     campaign_id: Mapped[int] = mapped_column(ForeignKey("campaign.id"))
     contact_id: Mapped[int] = mapped_column(ForeignKey("contact.id"))
@@ -74,6 +93,8 @@ class EmailSend(Base):
 
 class Event(Base):
     __tablename__ = "event"
+    # per-send event lookups (opens/clicks of a send, newest first)
+    __table_args__ = (Index("ix_event_send_type_ts", "email_send_id", "type", "ts"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     email_send_id: Mapped[int] = mapped_column(ForeignKey("email_send.id"))
     type: Mapped[str] = mapped_column(String(16)) # open|click|bounce|complaint|unsubscribe
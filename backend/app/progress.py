@@ -0,0 +1,46 @@
+import time
+
+# Per-campaign send counters kept in one Redis hash so progress reads are O(1)
+# instead of COUNT(*) over email_send. Every helper accepts either a Redis client
+# or a pipeline so counters can ride along with the writes they describe.
+
+COUNTERS = ("snapshotted", "enqueued", "sent", "failed", "suppressed")
+
+def progress_key(campaign_id: int) -> str:
+    return f"campaign:{campaign_id}:progress"
+
+def reset(r, campaign_id: int, job_id: str):
+    key = progress_key(campaign_id)
+    r.delete(key)
+    r.hset(key, mapping={"job_id": job_id, "state": "queued", "queued_at": time.time(), **{c: 0 for c in COUNTERS}})
+
+def set_state(r, campaign_id: int, state: str):
+    r.hset(progress_key(campaign_id), "state", state)
+
+def incr(r, campaign_id: int, counter: str, n: int = 1):
+    r.hincrby(progress_key(campaign_id), counter, n)
+
+def record_sends(r, campaign_id: int, sent: int, failed: int, suppressed: int = 0):
+    key, now = progress_key(campaign_id), time.time()
+    pipe = r.pipeline(transaction=False)
+    pipe.hincrby(key, "sent", sent)
+    pipe.hincrby(key, "failed", failed)
+    if suppressed:
+        pipe.hincrby(key, "suppressed", suppressed)
+    pipe.hsetnx(key, "first_send_at", now)
+    pipe.hset(key, "last_send_at", now)
+    pipe.execute()
+
+def read(r, campaign_id: int) -> dict:
+    raw = {k.decode(): v.decode() for k, v in r.hgetall(progress_key(campaign_id)).items()}
+    out = {c: int(raw.get(c, 0)) for c in COUNTERS}
+    out["state"] = raw.get("state")
+    if out["state"] == "sending" and out["snapshotted"] and out["sent"] + out["failed"] + out["suppressed"] >= out["snapshotted"]:
+        out["state"] = "complete"
+    out["job_id"] = raw.get("job_id")
+    if raw.get("error"):
+        out["error"] = raw["error"]
+    first, last = float(raw.get("first_send_at", 0)), float(raw.get("last_send_at", 0))
+    elapsed = last - first
+    out["throughput"] = round((out["sent"] + out["failed"]) / elapsed, 2) if elapsed > 0 else 0.0
+    return out
@@ -0,0 +1,81 @@
+"""Send queue layout: priority classes plus bulk queues sharded by recipient domain.
+
+Bulk traffic for each domain in BULK_SHARDS gets its own queue (everything
+else shares ``send:bulk``), so a worker can be dedicated to one mailbox
+provider and each domain drains at its own pace. ``ShardWorker`` always checks
+the PRIORITY queues first, so transactional sends never wait behind a bulk
+campaign, and rotates through the rest after every job so one shard's backlog
+does not starve the others. ``python -m app.queues`` prints the worker's queue
+list for the rq command line (``rq worker -w app.queues.ShardWorker ...``).
+"""
+from functools import lru_cache
+from rq import Queue, SimpleWorker, Worker
+from rq.registry import DeferredJobRegistry, FailedJobRegistry, ScheduledJobRegistry, StartedJobRegistry
+from .config import settings
+
+TRANSACTIONAL = "send:transactional"
+SCHEDULE = "schedule"
+BULK = "send:bulk"
+IMPORTS = "imports"  # contact file imports (app.contacts.imports)
+LEGACY = "send"  # drained last so jobs queued before the split still run
+PRIORITY = (TRANSACTIONAL, SCHEDULE)  # always checked first, in this order
+
+def bulk_shards() -> list[str]:
+    return [d.strip().lower() for d in settings.bulk_shards.split(",") if d.strip()]
+
+def domain_of(email: str) -> str:
+    return email.rpartition("@")[2].lower()
+
+def shard_for(email: str) -> str:
+    """Shard key for a recipient: its domain if it has a dedicated queue, else "" (the shared bulk queue)."""
+    domain = domain_of(email)
+    return domain if domain in bulk_shards() else ""
+
+def bulk_queue_name(shard: str) -> str:
+    return f"{BULK}:{shard}" if shard else BULK
+
+def all_queues() -> list[str]:
+    """Every queue workers drain, highest priority first."""
+    return [TRANSACTIONAL, SCHEDULE, *(bulk_queue_name(d) for d in bulk_shards()), BULK, IMPORTS, LEGACY]
+
+def worker_queues() -> list[str]:
+    """Queues this worker drains, in priority order (WORKER_QUEUES narrows it, e.g. to one shard)."""
+    chosen = [q.strip() for q in settings.worker_queues.split(",") if q.strip()]
+    return chosen or all_queues()
+
+class ShardWorker(SimpleWorker):
+    """Keeps the PRIORITY queues first and round-robins the others after each job."""
+
+    def reorder_queues(self, reference_queue: Queue):
+        head = [q for q in self._ordered_queues if q.name in PRIORITY]
+        rest = [q for q in self._ordered_queues if q.name not in PRIORITY]
+        if reference_queue in rest:
+            pos = rest.index(reference_queue)
+            rest = rest[pos + 1:] + rest[:pos + 1]
+        self._ordered_queues = head + rest
+
+@lru_cache(maxsize=None)
+def get_queue(name: str) -> Queue:
+    from .tasks import redis
+    return Queue(name, connection=redis)
+
+def stats() -> list[dict]:
+    """Depth and job states per queue, plus how many workers listen on it."""
+    from .tasks import redis
+    workers = Worker.all(connection=redis)
+    out = []
+    for name in all_queues():
+        q = get_queue(name)
+        out.append({
+            "name": name,
+            "queued": q.count,
+            "started": StartedJobRegistry(queue=q).count,
+            "scheduled": ScheduledJobRegistry(queue=q).count,
+            "deferred": DeferredJobRegistry(queue=q).count,
+            "failed": FailedJobRegistry(queue=q).count,
+            "workers": sum(name in w.queue_names() for w in workers),
+        })
+    return out
+
+if __name__ == "__main__":
+    print(" ".join(worker_queues()))
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ..db import get_db
-from ..models import Campaign, EmailTemplate, Segment, Contact
+from ..models import Campaign, CampaignRecipient, EmailTemplate, Segment, Contact
 from ..schemas import CampaignIn
+from ..tasks import STARTABLE, redis, schedule_queue, resume_campaign, start_campaign
+from ..scheduler import is_future, wake_scheduler
 from ..segments.compiler import compile_segment
-from ..tasks import snapshot_recipients
+from .. import progress
 from ..deps import get_current_user
 from ..models import User
 
@@ -20,6 +22,7 @@ def list_campaigns(skip: int = 0, limit: int = 100, db: Session = Depends(get_db
         "template_id": c.template_id,
         "segment_id": c.segment_id,
         "send_at": c.send_at,
+        "send_window": c.send_window,
         "status": c.status,
         "custom_content": c.custom_content
     } for c in campaigns]}
@@ -41,6 +44,7 @@ def get_campaign(cid: int, db: Session = Depends(get_db), current_user: User = D
         "template_id": campaign.template_id,
         "segment_id": campaign.segment_id,
         "send_at": campaign.send_at,
+        "send_window": campaign.send_window,
         "status": campaign.status,
         "custom_content": campaign.custom_content
     }
@@ -64,10 +68,37 @@ def schedule(cid: int, db: Session = Depends(get_db)):
     if not campaign: raise HTTPException(404)
     seg = db.get(Segment, campaign.segment_id)
     if not seg: raise HTTPException(400, "segment missing")
-    sql, params = compile_segment(seg.definition)
-    ids = [r[0] for r in db.execute(sql, params)]
-    if not ids:
-        return {"scheduled": 0}
-    snapshot_recipients(db, cid, ids)
-    campaign.status = "sending"; db.commit()
-    return {"scheduled": len(ids)}
+    try:
+        compile_segment(seg.definition)
+    except ValueError as e:
+        raise HTTPException(400, f"Invalid segment definition: {e}")
+    if campaign.status not in STARTABLE:
+        raise HTTPException(409, f"Campaign is already {campaign.status}")
+    if is_future(campaign.send_at):
+        # the scheduler process starts it at send_at
+        progress.reset(redis, cid, "")
+        progress.set_state(redis, cid, "scheduled")
+        campaign.status = "scheduled"; db.commit()
+        wake_scheduler(redis)
+        return {"job_id": None, "status": "scheduled", "send_at": campaign.send_at}
+    job_id = start_campaign(db, cid)
+    if job_id is None:
+        raise HTTPException(409, "Campaign was started by another request")
+    return {"job_id": job_id, "status": "queued"}
+
+@router.post("/{cid}/resume")
+def resume(cid: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Re-enqueue only the unsent chunks of an interrupted campaign"""
+    campaign = db.get(Campaign, cid)
+    if not campaign: raise HTTPException(404, "Campaign not found")
+    if not db.query(CampaignRecipient).filter_by(campaign_id=cid).first():
+        raise HTTPException(409, "Campaign has no recipients yet; schedule it instead")
+    job = schedule_queue.enqueue(resume_campaign, cid)
+    return {"job_id": job.id, "status": "queued"}
+
+@router.get("/{cid}/progress")
+def campaign_progress(cid: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Snapshot/enqueue/send counters for a campaign, read from Redis"""
+    campaign = db.get(Campaign, cid)
+    if not campaign: raise HTTPException(404, "Campaign not found")
+    return {"campaign_id": cid, "status": campaign.status, **progress.read(redis, cid)}
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List
-import pandas as pd
-import io
+import csv, os, uuid, zipfile
+from ..contacts import importer, imports
 from ..db import get_db
 from ..deps import get_current_user
 from ..models import Contact, User
+from ..tasks import redis
 from ..schemas import ContactIn, ContactOut
+from ..segments import bitmap, membership
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
@@ -31,6 +34,7 @@ def create_contact(contact_data: ContactIn, db: Session = Depends(get_db), curre
     db.add(contact)
     db.commit()
     db.refresh(contact)
+    membership.refresh_contacts(db, [contact.id])
     return contact
 
 @router.get("/{contact_id}", response_model=ContactOut)
@@ -57,10 +61,15 @@ def update_contact(contact_id: int, contact_data: ContactIn, db: Session = Depen
                 detail="Contact with this email already exists"
             )
     
+    changed = set()
     for field, value in contact_data.model_dump().items():
+        if getattr(contact, field) != value:
+            changed.add(field)
         setattr(contact, field, value)
     
     db.commit()
+    if changed:
+        membership.refresh_contacts(db, [contact.id], changed)
     db.refresh(contact)
     return contact
 
@@ -73,117 +82,80 @@ def delete_contact(contact_id: int, db: Session = Depends(get_db), current_user:
     
     db.delete(contact)
     db.commit()
+    bitmap.contacts_changed([contact_id])
     return {"message": "Contact deleted successfully"}
 
 
+def _check_upload(file: UploadFile, on_duplicate: str) -> str:
+    ext = imports.extension(file.filename)
+    if not ext:
+        raise HTTPException(
+            status_code=400,
+            detail="File must be CSV or Excel (.xlsx) format"
+        )
+    if on_duplicate not in importer.ON_DUPLICATE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"on_duplicate must be one of {', '.join(importer.ON_DUPLICATE)}"
+        )
+    return ext
+
 @router.post("/bulk-upload")
-async def bulk_upload_contacts(
+def bulk_upload_contacts(
     file: UploadFile = File(...),
+    on_duplicate: str = Query("skip", description="skip | update | merge_tags"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Bulk upload contacts from CSV/Excel file"""
-    if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
-        raise HTTPException(
-            status_code=400,
-            detail="File must be CSV or Excel format"
-        )
-    
+    """Bulk upload contacts from CSV/Excel file and wait for the result (large files: POST /contacts/imports)"""
+    ext = _check_upload(file, on_duplicate)
+    path = imports.spool(file.file, uuid.uuid4().hex + ext)
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Parse file based on extension
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-        else:
-            df = pd.read_excel(io.BytesIO(content))
-        
-        # Validate required columns
-        required_columns = ['email']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Missing required columns: {missing_columns}"
-            )
-        
-        # Process contacts
-        created_contacts = []
-        errors = []
-        
-        for index, row in df.iterrows():
-            try:
-                # Extract and clean data
-                email = str(row.get('email', '')).strip() if pd.notna(row.get('email')) else ''
-                first_name = str(row.get('first_name', '')).strip() if pd.notna(row.get('first_name')) else None
-                last_name = str(row.get('last_name', '')).strip() if pd.notna(row.get('last_name')) else None
-                phone = str(row.get('phone', '')).strip() if pd.notna(row.get('phone')) else None
-                company = str(row.get('company', '')).strip() if pd.notna(row.get('company')) else None
-                tags_str = str(row.get('tags', '')).strip() if pd.notna(row.get('tags')) else None
-                
-                # Skip if email is empty
-                if not email:
-                    errors.append(f"Row {index + 2}: Email is required")
-                    continue
-                
-                # Check if contact already exists
-                existing_contact = db.query(Contact).filter(Contact.email == email).first()
-                if existing_contact:
-                    errors.append(f"Row {index + 2}: Contact with email {email} already exists")
-                    continue
-                
-                # Prepare attributes
-                attributes = {}
-                if first_name:
-                    attributes['first_name'] = first_name
-                if last_name:
-                    attributes['last_name'] = last_name
-                if phone:
-                    attributes['phone'] = phone
-                if company:
-                    attributes['company'] = company
-                
-                # Prepare tags
-                tags = []
-                if tags_str:
-                    tags = [tag.strip() for tag in tags_str.split(',') if tag.strip()]
-                
-                # Create new contact
-                contact = Contact(
-                    email=email,
-                    attributes=attributes,
-                    tags=tags
-                )
-                
-                contact_data = {
-                    'email': email,
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'phone': phone,
-                    'company': company,
-                    'tags': tags_str
-                }
-                
-                db.add(contact)
-                created_contacts.append(contact_data)
-                
-            except Exception as e:
-                errors.append(f"Row {index + 2}: {str(e)}")
-        
-        # Commit all changes
-        db.commit()
-        
-        return {
-            "message": f"Successfully uploaded {len(created_contacts)} contacts",
-            "created_count": len(created_contacts),
-            "error_count": len(errors),
-            "errors": errors[:10]  # Limit errors to first 10
-        }
-        
-    except pd.errors.EmptyDataError:
-        raise HTTPException(status_code=400, detail="File is empty")
-    except pd.errors.ParserError:
-        raise HTTPException(status_code=400, detail="Invalid file format")
+        stats = importer.import_rows(db, imports.read_rows(path), on_duplicate)
+    except (ValueError, csv.Error, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid file: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    finally:
+        os.remove(path)
+    
+    return {
+        "message": f"Successfully uploaded {stats.created} contacts",
+        "created_count": stats.created,
+        "updated_count": stats.updated,
+        "skipped_count": stats.skipped,
+        "error_count": stats.error_count,
+        "errors": stats.errors[:10]  # Limit errors to first 10
+    }
+
+def _import_status(import_id: str) -> dict:
+    info = imports.read(redis, import_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    if info["error_count"] and os.path.exists(imports.report_path(import_id)):
+        info["error_report"] = f"/contacts/imports/{import_id}/errors"
+    return info
+
+@router.post("/imports", status_code=status.HTTP_202_ACCEPTED)
+def create_import(
+    file: UploadFile = File(...),
+    on_duplicate: str = Query("skip", description="skip | update | merge_tags"),
+    current_user: User = Depends(get_current_user)
+):
+    """Spool a CSV/Excel file to disk and import it in the background"""
+    _check_upload(file, on_duplicate)
+    return _import_status(imports.start_import(redis, file.file, file.filename, on_duplicate))
+
+@router.get("/imports/{import_id}")
+def get_import(import_id: str, current_user: User = Depends(get_current_user)):
+    """Progress of a background import: rows processed, rows/sec and counts"""
+    return _import_status(import_id)
+
+@router.get("/imports/{import_id}/errors")
+def download_import_errors(import_id: str, current_user: User = Depends(get_current_user)):
+    """CSV of every rejected row (row number, error)"""
+    _import_status(import_id)
+    path = imports.report_path(import_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No error report for this import")
+    return FileResponse(path, media_type="text/csv", filename=f"import-{import_id}-errors.csv")
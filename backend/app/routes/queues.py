@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Depends
+from ..deps import get_current_user
+from ..models import User
+from .. import queues
+
+router = APIRouter(prefix="/queues", tags=["queues"])
+
+@router.get("")
+def queue_stats(current_user: User = Depends(get_current_user)):
+    """Depth, job states and listening workers for every send queue, highest priority first"""
+    return {"data": queues.stats()}
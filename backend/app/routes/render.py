@@ -0,0 +1,17 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from ..templating.render import render_mjml
+
+router = APIRouter(prefix="/render", tags=["render"])
+
+class RenderIn(BaseModel):
+    mjml: str
+    vars: dict | None = None  # omitted: compile only, {{placeholders}} are left in place
+
+@router.post("")
+def render(payload: RenderIn):
+    """Compile MJML to HTML; without vars this is the per-campaign compile step used by the worker"""
+    try:
+        return {"html": render_mjml(payload.mjml, payload.vars)}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error rendering template: {str(e)}")
@@ -3,12 +3,16 @@ from sqlalchemy.orm import Session
 from typing import List
 from ..db import get_db
 from ..deps import get_current_user
-from ..models import Segment, User
-from ..schemas import SegmentIn
+from ..tasks import redis
+from ..models import Contact, Segment, User
+from ..schemas import SegmentDefinitionIn, SegmentEvaluateIn, SegmentIn
+from ..segments import counts, membership
 from ..segments.compiler import compile_segment
 
 router = APIRouter(prefix="/segments", tags=["segments"])
 
+PREVIEW_LIMIT = 10
+
 @router.get("", response_model=dict)
 def list_segments(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Get list of segments"""
@@ -115,6 +119,8 @@ def update_segment(segment_id: int, segment_data: SegmentIn, db: Session = Depen
             detail=f"Invalid segment definition: {str(e)}"
         )
     
+    if segment_data.definition != segment.definition:
+        membership.invalidate(db, segment)
     for key, value in segment_data.model_dump().items():
         setattr(segment, key, value)
     
@@ -138,33 +144,71 @@ def delete_segment(segment_id: int, db: Session = Depends(get_db), current_user:
     db.commit()
     return {"message": "Segment deleted successfully"}
 
+@router.post("/{segment_id}/materialize", response_model=dict)
+def materialize_segment(segment_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Rebuild the stored membership of a segment; contact writes keep it current afterwards"""
+    segment = db.get(Segment, segment_id)
+    if not segment:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    count = membership.materialize(db, segment)
+    return {"id": segment.id, "member_count": count, "materialized_at": segment.materialized_at}
+
+def _preview(db: Session, definition: dict, stmt, estimate: bool) -> dict:
+    counted = counts.segment_count(db, redis, definition, stmt, estimate)
+    contacts = db.scalars(stmt.with_only_columns(Contact, maintain_column_froms=True).limit(PREVIEW_LIMIT)).all()
+    return {
+        "total_count": counted["count"],
+        "estimated": counted["estimated"],
+        "preview_contacts": [{
+            "id": c.id,
+            "email": c.email,
+            "attributes": c.attributes,
+            "tags": c.tags
+        } for c in contacts]
+    }
+
+@router.post("/preview", response_model=dict)
+def preview_definition(payload: SegmentDefinitionIn, estimate: bool = False, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Count and sample contacts for an unsaved definition (segment builder)"""
+    try:
+        stmt = compile_segment(payload.definition)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid segment definition: {str(e)}")
+    return _preview(db, payload.definition, stmt, estimate)
+
+@router.post("/evaluate", response_model=dict)
+def evaluate_segments(payload: SegmentEvaluateIn, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Count several segments (and optionally their pairwise overlaps) in one pass over contacts"""
+    ids = list(dict.fromkeys(payload.segment_ids))
+    if payload.overlap and len(ids) > counts.MAX_OVERLAP:
+        raise HTTPException(status_code=400, detail=f"Overlap is limited to {counts.MAX_OVERLAP} segments")
+    segments = {s.id: s for s in db.query(Segment).filter(Segment.id.in_(ids))}
+    missing = [i for i in ids if i not in segments]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Segments not found: {missing}")
+    
+    try:
+        result = counts.evaluate_many(db, [segments[i].definition for i in ids], payload.overlap)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error executing segment: {str(e)}"
+        )
+    return {
+        "segments": [{"id": i, "name": segments[i].name, "count": n} for i, n in zip(ids, result["counts"])],
+        "overlap": result["overlap"]
+    }
+
 @router.post("/{segment_id}/preview", response_model=dict)
-def preview_segment(segment_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    """Preview contacts that match this segment"""
+def preview_segment(segment_id: int, estimate: bool = False, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Preview contacts that match this segment: total (exact, or estimated with ?estimate=true) and the first few"""
     segment = db.get(Segment, segment_id)
     if not segment:
         raise HTTPException(status_code=404, detail="Segment not found")
     
     try:
-        from sqlalchemy.sql import text
-        sql, params = compile_segment(segment.definition)
-        result = db.execute(text(sql), params)
-        contact_ids = [row[0] for row in result]
-        
-        # Get actual contact details for preview
-        from ..models import Contact
-        contacts = db.query(Contact).filter(Contact.id.in_(contact_ids)).limit(10).all() if contact_ids else []
-        
-        return {
-            "total_count": len(contact_ids),
-            "preview_contacts": [{
-                "id": c.id,
-                "email": c.email,
-                "attributes": c.attributes,
-                "tags": c.tags
-            } for c in contacts]
-        }
-    except Exception as e:
+        return _preview(db, segment.definition, membership.recipients(segment), estimate)
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Error executing segment: {str(e)}"
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Response, Depends
+from fastapi import APIRouter, Response, Depends, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from ..db import get_db
-from ..models import Event
+from ..models import Event, CampaignRecipient, CampaignLink, EmailSend
 from fastapi.responses import RedirectResponse
 
 router = APIRouter(prefix="/t", tags=["track"])
@@ -15,10 +16,34 @@ def open(sid: int, db: Session = Depends(get_db)):
         s.add(ev); s.commit()
     return Response(content=GIF, media_type="image/gif")
 
+# campaign id -> {link id -> url}. Ids are never reassigned, but edited content adds
+# new ones, so an id missing from the cached table reloads it.
+LINK_CACHE_MAX = 1024
+_links: dict[int, dict[int, str]] = {}
+
+def link_url(db: Session, campaign_id: int, link_id: int) -> str | None:
+    links = _links.get(campaign_id)
+    if links is None or link_id not in links:
+        links = dict(db.execute(select(CampaignLink.link_id, CampaignLink.url).where(CampaignLink.campaign_id == campaign_id)).all())
+        _links.pop(campaign_id, None)
+        if len(_links) >= LINK_CACHE_MAX:
+            _links.pop(next(iter(_links)))
+        _links[campaign_id] = links
+    return links.get(link_id)
+
 @router.get("/r/{token}")
-def click(token: str, u: str, db: Session = Depends(get_db)):
-    # In real impl, map token -> email_send_id
-    ev = Event(email_send_id=0, type="click", meta={"token": token, "url": u})
-    with next(db) as s:
-        s.add(ev); s.commit()
-    return RedirectResponse(u)
+def click(token: str, l: int, db: Session = Depends(get_db)):
+    # token -> recipient (and its send, if recorded); link id -> url from the campaign link table
+    row = db.execute(
+        select(CampaignRecipient.campaign_id, EmailSend.id)
+        .outerjoin(EmailSend, (EmailSend.campaign_id == CampaignRecipient.campaign_id) & (EmailSend.contact_id == CampaignRecipient.contact_id))
+        .where(CampaignRecipient.token == token)
+        .limit(1)
+    ).first()
+    url = link_url(db, row[0], l) if row else None
+    if not url:
+        raise HTTPException(status_code=404, detail="Link not found")
+    if row[1] is not None:
+        db.add(Event(email_send_id=row[1], type="click", meta={"token": token, "link_id": l, "url": url}))
+        db.commit()
+    return RedirectResponse(url)
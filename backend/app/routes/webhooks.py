@@ -1,7 +1,63 @@
-from fastapi import APIRouter
+import hmac, json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..db import get_db
+from ..email import sns
+from ..models import Contact
+from ..segments import membership
+from ..sending.suppression import suppress
+from ..tasks import redis
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 
+def _suppressions(payload: dict) -> list[tuple[str, str]]:
+    """(email, reason) pairs from an SES/SNS notification or a generic {"email", "type"} body."""
+    if payload.get("Type") == "Notification":  # SNS envelope around an SES event
+        payload = json.loads(payload.get("Message") or "{}")
+    kind = (payload.get("notificationType") or payload.get("eventType") or "").lower()
+    if kind == "bounce" and payload.get("bounce", {}).get("bounceType") == "Permanent":
+        return [(r["emailAddress"], "bounce") for r in payload["bounce"].get("bouncedRecipients", [])]
+    if kind == "complaint":
+        return [(r["emailAddress"], "complaint") for r in payload["complaint"].get("complainedRecipients", [])]
+    if payload.get("email") and payload.get("type") in ("bounce", "complaint", "unsubscribe"):
+        return [(payload["email"], payload["type"])]
+    return []
+
+async def json_body(request: Request) -> dict:
+    # SNS posts JSON as text/plain, so parse the raw body rather than rely on the content type
+    body = await request.body()
+    try:
+        return json.loads(body) if body else {}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+
+def _secret_ok(request: Request) -> bool:
+    given = request.headers.get("x-webhook-secret") or request.query_params.get("token") or ""
+    return bool(settings.webhook_secret) and hmac.compare_digest(given, settings.webhook_secret)
+
+def _authorized(request: Request, payload: dict) -> bool:
+    """SNS messages need a valid signature plus an allowed topic (or the secret); anything else needs the secret."""
+    if sns.is_sns(payload):
+        topics = {t.strip() for t in settings.sns_topic_arns.split(",") if t.strip()}
+        return sns.verify(payload) and (payload.get("TopicArn") in topics or _secret_ok(request))
+    return _secret_ok(request)
+
 @router.post("/provider/{name}")
-def provider_webhook(name: str):
-    return {"status": "ok", "provider": name}
+def provider_webhook(name: str, request: Request, payload: dict = Depends(json_body), db: Session = Depends(get_db)):
+    if not _authorized(request, payload):
+        raise HTTPException(status_code=403, detail="Unauthorized webhook")
+    if payload.get("Type") == "SubscriptionConfirmation":
+        return {"status": "confirmed" if sns.confirm_subscription(payload) else "not confirmed", "provider": name}
+    pairs = _suppressions(payload)
+    for email, reason in pairs:
+        suppress(db, redis, email, reason)
+    unsubscribed = [e.strip().lower() for e, reason in pairs if reason == "unsubscribe"]
+    if unsubscribed:
+        ids = db.execute(
+            update(Contact).where(func.lower(Contact.email).in_(unsubscribed)).values(status="unsubscribed").returning(Contact.id)
+        ).scalars().all()
+        db.commit()
+        membership.refresh_contacts(db, ids, {"status"})
+    return {"status": "ok", "provider": name, "suppressed": len(pairs)}
@@ -0,0 +1,133 @@
+"""Scheduler process that starts campaigns at their ``send_at``.
+
+Run one or more replicas with ``python -m app.scheduler``. Upcoming campaigns
+(status ``scheduled``) are kept in an in-memory heap ordered by send time and
+refreshed from the ``(status, send_at)`` index; the process sleeps until the
+earliest one is due and then hands it to ``start_campaign``. Only the replica
+holding the Redis leader lock fires campaigns, and the conditional
+``scheduled -> scheduling`` update means a campaign starts at most once even
+across a leadership change.
+"""
+import heapq, logging, signal, threading, time
+from datetime import datetime, timedelta, timezone
+from redis.exceptions import LockError
+from sqlalchemy import select
+from .config import settings
+from .db import SessionLocal
+from .models import Campaign
+from .tasks import redis, start_campaign
+
+log = logging.getLogger(__name__)
+
+LOCK_KEY = "scheduler:leader"
+# Published by the API when a campaign is (re)scheduled so the heap is refreshed right away
+WAKE_CHANNEL = "scheduler:wake"
+
+def _utc(ts) -> datetime | None:
+    if ts is None:
+        return None
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+def is_future(send_at) -> bool:
+    ts = _utc(send_at)
+    return ts is not None and ts > datetime.now(timezone.utc)
+
+def wake_scheduler(r):
+    r.publish(WAKE_CHANNEL, "1")
+
+class Scheduler:
+    def __init__(self, r, refresh_interval: float = 30.0, horizon: float = 3600.0, lock_ttl: float = 15.0):
+        self.r, self.refresh_interval, self.horizon, self.lock_ttl = r, refresh_interval, horizon, lock_ttl
+        self.heap: list[tuple[float, int]] = []
+        self.lock = r.lock(LOCK_KEY, timeout=lock_ttl, thread_local=False)
+        self.wake = threading.Event()
+        self.stopped = False
+        self._next_refresh = 0.0
+
+    def refresh(self):
+        """Reload campaigns due within ``horizon`` seconds (the heap is rebuilt, so edits to send_at apply)."""
+        until = datetime.now(timezone.utc) + timedelta(seconds=self.horizon)
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(Campaign.id, Campaign.send_at)
+                .where(Campaign.status == "scheduled", Campaign.send_at <= until)
+                .order_by(Campaign.send_at)
+            ).all()
+        self.heap = [(_utc(at).timestamp(), cid) for cid, at in rows]
+        heapq.heapify(self.heap)
+        self._next_refresh = time.monotonic() + self.refresh_interval
+
+    def fire(self, campaign_id: int) -> bool:
+        try:
+            with SessionLocal() as db:
+                job_id = start_campaign(db, campaign_id, Campaign.status == "scheduled",
+                                        Campaign.send_at <= datetime.now(timezone.utc))
+        except Exception:
+            # start_campaign put it back to scheduled; the next refresh picks it up again
+            log.exception("could not start campaign %s", campaign_id)
+            self._next_refresh = 0.0
+            return False
+        if job_id:
+            log.info("started campaign %s", campaign_id)
+        return job_id is not None
+
+    def _lead(self) -> bool:
+        try:
+            if self.lock.owned():
+                return self.lock.extend(self.lock_ttl, replace_ttl=True)
+            return self.lock.acquire(blocking=False)
+        except LockError:
+            return False
+
+    def _listen(self):
+        while not self.stopped:
+            try:
+                pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(WAKE_CHANNEL)
+                for _ in pubsub.listen():
+                    self._next_refresh = 0.0
+                    self.wake.set()
+            except Exception:
+                log.exception("scheduler wake listener lost its connection; reconnecting")
+                time.sleep(1)
+
+    def run_once(self) -> float:
+        """Fire whatever is due; returns how long to sleep before the next look."""
+        if not self._lead():
+            return self.lock_ttl / 3
+        if time.monotonic() >= self._next_refresh:
+            self.refresh()
+        now = time.time()
+        while self.heap and self.heap[0][0] <= now:
+            _, campaign_id = heapq.heappop(self.heap)
+            self.fire(campaign_id)
+        wait = min(self._next_refresh - time.monotonic(), self.lock_ttl / 3)
+        if self.heap:
+            wait = min(wait, self.heap[0][0] - time.time())
+        return max(wait, 0.0)
+
+    def run(self):
+        threading.Thread(target=self._listen, name="scheduler-wake", daemon=True).start()
+        while not self.stopped:
+            try:
+                wait = self.run_once()
+            except Exception:
+                log.exception("scheduler pass failed")
+                wait = 1.0
+            self.wake.wait(wait)
+            self.wake.clear()
+        if self.lock.owned():
+            self.lock.release()
+
+    def stop(self, *_):
+        self.stopped = True
+        self.wake.set()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    scheduler = Scheduler(redis, refresh_interval=settings.scheduler_refresh)
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    scheduler.run()
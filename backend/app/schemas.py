@@ -36,6 +36,13 @@ class SegmentIn(BaseModel):
     name: str
     definition: dict
 
+class SegmentDefinitionIn(BaseModel):
+    definition: dict
+
+class SegmentEvaluateIn(BaseModel):
+    segment_ids: List[int]
+    overlap: bool = False
+
 class EmailTemplateIn(BaseModel):
     name: str
     mjml: str
@@ -45,4 +52,5 @@ class CampaignIn(BaseModel):
     template_id: int
     segment_id: int
     send_at: Optional[str] = None
+    send_window: Optional[int] = None  # seconds; spread delivery over this window
     custom_content: Optional[str] = None  # Custom MJML content for this campaign
\ No newline at end of file
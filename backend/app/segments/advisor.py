@@ -0,0 +1,127 @@
+"""Index advisor for segment filters: ``python -m app.segments.advisor``.
+
+Walks every stored ``Segment.definition``, counts how many segments filter on
+each attribute key (and as which type), and proposes an expression index for
+keys used by at least ``--min-segments`` segments. The indexed expression is
+the one the compiler emits (e.g. ``CAST((attributes ->> 'plan') AS VARCHAR)``),
+restricted to subscribed contacts like every compiled segment, so the planner
+can use it as is. ``--apply`` creates the missing indexes (CONCURRENTLY on
+Postgres); ``--explain`` prints each segment's plan and flags full scans of
+``contact``.
+"""
+import argparse, re
+from collections import Counter
+from sqlalchemy import Index, inspect, text
+from sqlalchemy.schema import CreateIndex
+from ..db import SessionLocal, engine
+from ..models import Contact, Segment
+from .compiler import attr_number, compile_segment
+
+# attribute expressions exactly as the compiler emits them, by comparison type
+KINDS = {
+    "str": lambda key: Contact.__table__.c.attributes[key].as_string(),
+    "float": attr_number,
+    "bool": lambda key: Contact.__table__.c.attributes[key].as_boolean(),
+}
+
+def _kind(value) -> str:
+    # same typing as the compiler's attribute comparisons
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "float"
+    return "str"
+
+def attribute_filters(defn) -> set[tuple[str, str]]:
+    """(key, kind) pairs for the attribute leaves of a definition."""
+    if not isinstance(defn, dict):
+        return set()
+    if "filters" in defn:
+        return set().union(*(attribute_filters(n) for n in defn["filters"]))
+    field, op, value = defn.get("field"), defn.get("op"), defn.get("value")
+    if not isinstance(field, str) or not field.startswith("attributes.") or field == "attributes.":
+        return set()
+    key = field.split(".", 1)[1]
+    if op in ("exists", "not_exists", "contains", "not_contains"):
+        return {(key, "str")}
+    if op in ("in", "not_in", "between") and isinstance(value, list):
+        return {(key, _kind(v)) for v in value if v is not None}
+    return {(key, _kind(value))}
+
+def index_for(key: str, kind: str) -> Index:
+    slug = re.sub(r"\W+", "_", key).strip("_").lower()[:40] or "key"
+    subscribed = Contact.__table__.c.status == "subscribed"
+    return Index(f"ix_contact_attr_{slug}_{kind}", KINDS[kind](key),
+                 postgresql_where=subscribed, sqlite_where=subscribed, postgresql_concurrently=True)
+
+def existing_indexes() -> set[str]:
+    # read the catalogs directly: reflection skips expression indexes on some backends
+    if engine.dialect.name == "postgresql":
+        sql = "SELECT indexname FROM pg_indexes WHERE tablename = 'contact'"
+    elif engine.dialect.name == "sqlite":
+        sql = "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'contact'"
+    else:
+        return {ix["name"] for ix in inspect(engine).get_indexes("contact")}
+    with engine.connect() as conn:
+        return set(conn.execute(text(sql)).scalars())
+
+def usage(segments) -> Counter:
+    """How many segments filter on each (key, kind)."""
+    counts = Counter()
+    for segment in segments:
+        counts.update(attribute_filters(segment.definition))
+    return counts
+
+def explain(db, segment) -> list[str]:
+    stmt = compile_segment(segment.definition)
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN" if engine.dialect.name == "postgresql" else "EXPLAIN QUERY PLAN"
+    return [" ".join(str(c) for c in row) for row in db.execute(text(f"{prefix} {sql}"))]
+
+def full_scan(plan: list[str]) -> bool:
+    return any("Seq Scan on contact" in line or re.search(r"\bSCAN contact\b(?! USING)", line) for line in plan)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.segments.advisor", description=__doc__.splitlines()[0])
+    parser.add_argument("--min-segments", type=int, default=2, help="propose keys filtered by at least this many segments")
+    parser.add_argument("--apply", action="store_true", help="create the proposed indexes")
+    parser.add_argument("--explain", action="store_true", help="show each segment's query plan")
+    args = parser.parse_args(argv)
+
+    existing = existing_indexes()
+    with SessionLocal() as db:
+        segments = db.query(Segment).all()
+    proposed = []
+    for (key, kind), n in usage(segments).most_common():
+        ix = index_for(key, kind)
+        state = "indexed" if ix.name in existing else ("proposed" if n >= args.min_segments else "rare")
+        print(f"attributes.{key} ({kind}): {n} segment(s), {state}")
+        if state == "proposed":
+            proposed.append(ix)
+
+    if proposed:
+        print()
+        for ix in proposed:
+            print(f"{str(CreateIndex(ix, if_not_exists=True).compile(dialect=engine.dialect)).strip()};")
+    if args.apply and proposed:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for ix in proposed:
+                conn.execute(CreateIndex(ix, if_not_exists=True))
+                print(f"created {ix.name}")
+        engine.dispose()  # pooled SQLite connections plan against the schema they last read
+
+    if args.explain:
+        with SessionLocal() as db:
+            for segment in segments:
+                try:
+                    plan = explain(db, segment)
+                except ValueError as e:
+                    print(f"\nsegment {segment.id} ({segment.name}): invalid definition: {e}")
+                    continue
+                flag = "  <- full scan of contact" if full_scan(plan) else ""
+                print(f"\nsegment {segment.id} ({segment.name}){flag}")
+                for line in plan:
+                    print(f"  {line}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""In-process bitmap index for counting segments without scanning contact JSON.
+
+One bitmap of contact ids per tag and per value of each low-cardinality
+attribute, plus one of every subscribed contact. Definition trees made only of
+AND/OR/NOT groups, tag leaves (eq, neq, contains, not_contains, in, not_in) and
+attribute leaves (eq, neq, in) are answered with set operations; anything else
+returns None and the caller runs the SQL plan.
+Bitmaps are pyroaring ``BitMap``s when installed, else Python int bitsets.
+
+Enabled with SEGMENT_BITMAP_INDEX=1. Each process loads the index on first use,
+reloads it every ``refresh_interval`` seconds, and re-reads contacts published
+on ``CHANNEL`` by the contact write paths in between.
+"""
+import logging, re, threading, time
+from collections import defaultdict
+from typing import Iterable
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from ..config import settings
+from ..models import Contact
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # optional: fall back to int bitsets
+    BitMap = None
+
+log = logging.getLogger(__name__)
+
+# Publishes comma-separated contact ids to re-read, or "*" for a full reload
+CHANNEL = "contacts:changed"
+# Attribute keys with more distinct values than this are not indexed (SQL handles them)
+MAX_ATTR_VALUES = 1000
+LOAD_BATCH = 10000
+
+class IntBitmap:
+    """Minimal bitmap over a Python int, bit i set for id i (used when pyroaring is missing)."""
+    __slots__ = ("bits",)
+
+    def __init__(self, ids: Iterable[int] = (), bits: int = 0):
+        ids = list(ids)
+        if ids:
+            buf = bytearray(max(ids) // 8 + 1)
+            for i in ids:
+                buf[i >> 3] |= 1 << (i & 7)
+            bits |= int.from_bytes(buf, "little")
+        self.bits = bits
+
+    def add(self, i: int):
+        self.bits |= 1 << i
+
+    def discard(self, i: int):
+        self.bits &= ~(1 << i)
+
+    def __contains__(self, i: int) -> bool:
+        return bool(self.bits >> i & 1)
+
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+    def __iter__(self):
+        bits, base = self.bits, 0
+        while bits:
+            low = bits & -bits
+            i = low.bit_length() - 1
+            yield base + i
+            bits >>= i + 1
+            base += i + 1
+
+    def __or__(self, other): return IntBitmap(bits=self.bits | other.bits)
+    def __and__(self, other): return IntBitmap(bits=self.bits & other.bits)
+    def __sub__(self, other): return IntBitmap(bits=self.bits & ~other.bits)
+
+def new_bitmap(ids: Iterable[int] = ()):
+    return BitMap(ids) if BitMap is not None else IntBitmap(ids)
+
+# Python twin of compiler.NUMERIC: numeric text also compares as a number
+NUMERIC = re.compile(r"^\s*-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?\s*$")
+
+def _query_key(value) -> tuple | None:
+    # typed like the compiler's comparisons: bools, numbers as float, strings; others are not indexed
+    if isinstance(value, bool):
+        return ("bool", value)
+    if isinstance(value, (int, float)):
+        return ("float", float(value))
+    if isinstance(value, str):
+        return ("str", value)
+    return None
+
+def _attr_keys(value) -> list[tuple]:
+    """Keys a stored attribute value is found under: numeric text under its number too."""
+    key = _query_key(value)
+    if key is None:
+        return []
+    if key[0] == "str" and NUMERIC.match(value):
+        return [key, ("float", float(value))]
+    return [key]
+
+def notify_changed(r, contact_ids: Iterable[int]):
+    ids = ",".join(str(i) for i in contact_ids)
+    if ids:
+        r.publish(CHANNEL, ids)
+
+class BitmapIndex:
+    def __init__(self, engine: Engine, r, refresh_interval: float = 300.0, max_values: int = MAX_ATTR_VALUES):
+        self.engine, self.r, self.refresh_interval, self.max_values = engine, r, refresh_interval, max_values
+        self.subscribed = new_bitmap()
+        self.tags: dict[str, object] = {}
+        self.attrs: dict[str, dict] = {}  # key -> {value: bitmap}; only low-cardinality keys
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        threading.Thread(target=self._listen, name="bitmap-listener", daemon=True).start()
+
+    def refresh(self):
+        """Rebuild every bitmap from the contact table."""
+        subscribed, tags = [], defaultdict(list)
+        attrs: dict[str, dict] = defaultdict(lambda: defaultdict(list))
+        wide: set[str] = set()
+        stmt = select(Contact.id, Contact.tags, Contact.attributes).where(Contact.status == "subscribed")
+        with self.engine.connect() as conn:
+            for cid, ctags, cattrs in conn.execution_options(yield_per=LOAD_BATCH).execute(stmt):
+                subscribed.append(cid)
+                for tag in ctags or ():
+                    tags[str(tag)].append(cid)
+                for key, value in (cattrs or {}).items():
+                    if key in wide:
+                        continue
+                    for k in _attr_keys(value):
+                        attrs[key][k].append(cid)
+                    if len(attrs.get(key, ())) > self.max_values:
+                        wide.add(key)
+                        del attrs[key]
+        built = (
+            new_bitmap(subscribed),
+            {t: new_bitmap(ids) for t, ids in tags.items()},
+            {k: {v: new_bitmap(ids) for v, ids in values.items()} for k, values in attrs.items()},
+        )
+        with self._lock:
+            self.subscribed, self.tags, self.attrs = built
+            self._loaded_at = time.monotonic()
+        log.info("bitmap index loaded: %d contacts, %d tags, %d attributes", len(subscribed), len(tags), len(attrs))
+
+    def update(self, contact_ids: list[int]):
+        """Re-read some contacts and move their bits (deleted or unsubscribed contacts drop out)."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(Contact.id, Contact.tags, Contact.attributes)
+                .where(Contact.id.in_(contact_ids), Contact.status == "subscribed")
+            ).all()
+        with self._lock:
+            for cid in contact_ids:
+                self.subscribed.discard(cid)
+                for bm in self.tags.values():
+                    bm.discard(cid)
+                for values in self.attrs.values():
+                    for bm in values.values():
+                        bm.discard(cid)
+            for cid, ctags, cattrs in rows:
+                self.subscribed.add(cid)
+                for tag in ctags or ():
+                    self.tags.setdefault(str(tag), new_bitmap()).add(cid)
+                for key, value in (cattrs or {}).items():
+                    values = self.attrs.get(key)
+                    if values is None:
+                        continue  # new keys are picked up by the next full refresh
+                    for k in _attr_keys(value):
+                        if k not in values and len(values) >= self.max_values:
+                            del self.attrs[key]
+                            break
+                        values.setdefault(k, new_bitmap()).add(cid)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for msg in pubsub.listen():
+                    data = msg["data"].decode() if isinstance(msg["data"], bytes) else str(msg["data"])
+                    if data == "*":
+                        self._loaded_at = 0.0
+                    elif self._loaded_at:
+                        self.update([int(i) for i in data.split(",")])
+            except Exception:
+                log.exception("bitmap index listener lost its connection; reconnecting")
+                self._loaded_at = 0.0  # may have missed messages
+                time.sleep(1)
+
+    def _leaf(self, node: dict):
+        field, op, value = node.get("field"), node.get("op"), node.get("value")
+        if field == "tags":
+            lookup = lambda v: self.tags.get(str(v)) or new_bitmap()
+        elif isinstance(field, str) and field.startswith("attributes."):
+            values = self.attrs.get(field.split(".", 1)[1])
+            if values is None:
+                return None
+            lookup = lambda v: values.get(_query_key(v)) or new_bitmap()
+            if _query_key(value) is None and op in ("eq", "neq"):
+                return None
+            if op in ("contains", "not_contains", "not_in"):
+                return None  # substring matches, and not_in's NULL handling, stay in SQL
+        else:
+            return None
+        if op in ("eq", "contains"):
+            return lookup(value)
+        if op in ("neq", "not_contains"):
+            return self.subscribed - lookup(value)
+        if op in ("in", "not_in"):
+            if not isinstance(value, list) or not value:
+                return None
+            if field != "tags" and any(_query_key(v) is None for v in value):
+                return None
+            hit = new_bitmap()
+            for v in value:
+                hit = hit | lookup(v)
+            return hit if op == "in" else self.subscribed - hit
+        return None
+
+    def _eval(self, defn):
+        if not isinstance(defn, dict):
+            return None
+        if "filters" not in defn:
+            return self._leaf(defn)
+        t = str(defn.get("op", "AND")).upper()
+        parts = [self._eval(n) for n in defn["filters"]]
+        if any(p is None for p in parts) or t not in ("AND", "OR", "NOT"):
+            return None
+        if t == "OR":
+            out = new_bitmap()
+            for p in parts:
+                out = out | p
+            return out
+        out = self.subscribed
+        for p in parts:
+            out = out & p
+        if t == "NOT":
+            return self.subscribed - out if parts else new_bitmap()
+        return out
+
+    def evaluate(self, defn: dict):
+        """Bitmap of subscribed contacts matching the definition, or None if it needs SQL."""
+        if time.monotonic() - self._loaded_at > self.refresh_interval:
+            self.refresh()
+        with self._lock:
+            hit = self._eval(defn)
+            return None if hit is None else hit & self.subscribed
+
+    def count(self, defn: dict) -> int | None:
+        hit = self.evaluate(defn)
+        return None if hit is None else len(hit)
+
+_index: BitmapIndex | None = None
+_index_lock = threading.Lock()
+
+def get_index() -> BitmapIndex | None:
+    """This process's index, created on first use; None unless SEGMENT_BITMAP_INDEX is set."""
+    global _index
+    if not settings.segment_bitmap_index:
+        return None
+    with _index_lock:
+        if _index is None:
+            from ..db import engine
+            from ..tasks import redis
+            _index = BitmapIndex(engine, redis, settings.segment_bitmap_refresh)
+    return _index
+
+def contacts_changed(contact_ids: Iterable[int]):
+    """Tell every process's index to re-read these contacts (no-op when the index is disabled)."""
+    if settings.segment_bitmap_index:
+        from ..tasks import redis
+        notify_changed(redis, contact_ids)
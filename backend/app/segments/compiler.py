@@ -1,30 +1,215 @@
-from sqlalchemy.sql import text
-
-# Supported ops: eq | contains (tags) | attr path eq
-
-def compile_segment(defn: dict) -> tuple[str, dict]:
-    clauses = []
-    params = {}
-
-    def walk(node, idx=[0]):
-        t = node.get("op", "AND").upper()
-        if "filters" in node:
-            parts = [walk(n) for n in node["filters"]]
-            return f" (" + f" {t} ".join(parts) + ") "
-        field, op, value = node.get("field"), node.get("op"), node.get("value")
-        key = f"p{idx[0]}"; idx[0]+=1
-        if field == "tags" and op == "contains":
-            params[key] = value
-            return f" tags::jsonb ? :{key} "
-        if field.startswith("attributes.") and op == "eq":
-            col = field.split(".",1)[1]
-            params[key] = value
-            return f" (attributes->>:col_{key}) = :{key} ".replace(":col_"+key, f"'{col}'")
-        if field == "email" and op == "eq":
-            params[key] = value
-            return f" email = :{key} "
-        raise ValueError("unsupported filter")
-
-    where = walk(defn)
-    sql = f"SELECT id FROM contact WHERE status='subscribed' AND ({where})"
-    return sql, params
+import hashlib, json, threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import Boolean, Float, and_, false, func, literal, not_, or_, select, true
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import ColumnElement, Select
+from sqlalchemy.sql.functions import FunctionElement
+from ..models import Contact
+
+# Segment definitions are JSON trees:
+#   {"op": "AND" | "OR" | "NOT", "filters": [...]}
+#   {"field": "email" | "status" | "created_at" | "tags" | "attributes.<key>", "op": ..., "value": ...}
+# Leaf ops: eq, neq, in, not_in, contains, not_contains, gt, gte, lt, lte,
+# between ([from, to], inclusive), exists, not_exists. compile_segment turns a
+# tree into a Core ``SELECT contact.id`` that runs on Postgres and SQLite.
+
+class json_array_contains(FunctionElement):
+    """``value`` is an element of the JSON array in ``column`` (used for tags)."""
+    type = Boolean()
+    inherit_cache = True
+    name = "json_array_contains"
+
+@compiles(json_array_contains)
+def _json_array_contains(element, compiler, **kw):
+    column, value = list(element.clauses)
+    return (f"EXISTS (SELECT 1 FROM json_each({compiler.process(column, **kw)}) "
+            f"WHERE json_each.value = {compiler.process(value, **kw)})")
+
+@compiles(json_array_contains, "postgresql")
+def _json_array_contains_pg(element, compiler, **kw):
+    column, value = list(element.clauses)
+    return f"(CAST({compiler.process(column, **kw)} AS JSONB) ? {compiler.process(value, **kw)})"
+
+# JSON number grammar (POSIX classes, no backslashes, so it survives literal rendering);
+# attribute text matching it compares numerically, since imports store numbers as text
+NUMERIC = "^[[:space:]]*-?(0|[1-9][0-9]*)([.][0-9]+)?([eE][-+]?[0-9]+)?[[:space:]]*$"
+
+class json_number(FunctionElement):
+    """Numeric value of ``attributes.<key>``: JSON numbers and numeric text, NULL for anything else."""
+    type = Float()
+    inherit_cache = True
+    name = "json_number"
+
+@compiles(json_number)
+def _json_number(element, compiler, **kw):
+    column, key = list(element.clauses)
+    col, path = compiler.process(column, **kw), compiler.process(key, **kw)
+    value = f"json_extract({col}, '$.\"' || {path} || '\"')"
+    # nested CASEs fix the evaluation order, so json_type never sees malformed text
+    return (f"(CASE WHEN json_type({col}, '$.\"' || {path} || '\"') IN ('integer', 'real') THEN CAST({value} AS REAL) "
+            f"WHEN json_type({col}, '$.\"' || {path} || '\"') = 'text' THEN "
+            f"CASE WHEN json_valid(trim({value})) THEN "
+            f"CASE WHEN json_type(trim({value})) IN ('integer', 'real') THEN CAST(trim({value}) AS REAL) END END END)")
+
+@compiles(json_number, "postgresql")
+def _json_number_pg(element, compiler, **kw):
+    column, key = list(element.clauses)
+    text = f"({compiler.process(column, **kw)} ->> {compiler.process(key, **kw)})"
+    pattern = compiler.process(literal(NUMERIC), **kw)
+    return f"(CASE WHEN {text} ~ {pattern} THEN CAST({text} AS FLOAT) END)"
+
+def attr_number(key: str) -> ColumnElement:
+    return json_number(Contact.attributes, literal(key))
+
+COLUMNS = {"email": Contact.email, "status": Contact.status, "created_at": Contact.created_at, "id": Contact.id}
+DATE_FIELDS = {"created_at"}
+GROUP_OPS = {"AND", "OR", "NOT"}
+
+def _attr(key: str, value):
+    """Typed accessor for attributes.<key> matching the Python type of the value it is compared with."""
+    element = Contact.attributes[key]
+    if isinstance(value, bool):
+        return element.as_boolean()
+    if isinstance(value, (int, float)):
+        return attr_number(key)
+    return element.as_string()
+
+def _values(node: dict) -> list:
+    value = node.get("value")
+    if not isinstance(value, list) or not value:
+        raise ValueError(f"{node.get('op')} on {node.get('field')} needs a non-empty list value")
+    return value
+
+def _range(node: dict) -> tuple:
+    values = _values(node)
+    if len(values) != 2 or values == [None, None]:
+        raise ValueError("between needs [from, to]")
+    return values[0], values[1]
+
+def _between(col, lo, hi, convert) -> ColumnElement:
+    bounds = []
+    if lo is not None:
+        bounds.append(col >= convert(lo))
+    if hi is not None:
+        bounds.append(col <= convert(hi))
+    return and_(*bounds)
+
+def _compare(col, op: str, value, convert):
+    if op == "eq":
+        return col == convert(value)
+    if op == "neq":
+        return or_(col != convert(value), col.is_(None))
+    if op in ("gt", "gte", "lt", "lte"):
+        return {"gt": col.__gt__, "gte": col.__ge__, "lt": col.__lt__, "lte": col.__le__}[op](convert(value))
+    raise ValueError(f"unsupported op {op!r}")
+
+def _leaf(node: dict) -> ColumnElement:
+    field, op, value = node.get("field"), node.get("op"), node.get("value")
+    if not isinstance(field, str) or not isinstance(op, str):
+        raise ValueError("filter needs a field and an op")
+
+    if field == "tags":
+        if op in ("contains", "eq"):
+            return json_array_contains(Contact.tags, str(value))
+        if op in ("not_contains", "neq"):
+            return not_(json_array_contains(Contact.tags, str(value)))
+        if op == "in":  # has any of the tags
+            return or_(*(json_array_contains(Contact.tags, str(v)) for v in _values(node)))
+        if op == "not_in":
+            return and_(*(not_(json_array_contains(Contact.tags, str(v))) for v in _values(node)))
+        raise ValueError(f"unsupported op {op!r} for tags")
+
+    if field.startswith("attributes."):
+        key = field.split(".", 1)[1]
+        if not key:
+            raise ValueError("attribute filter needs a key")
+        if op == "exists":
+            return Contact.attributes[key].as_string().is_not(None)
+        if op == "not_exists":
+            return Contact.attributes[key].as_string().is_(None)
+        if op == "contains":
+            return Contact.attributes[key].as_string().contains(str(value), autoescape=True)
+        if op == "not_contains":
+            col = Contact.attributes[key].as_string()
+            return or_(~col.contains(str(value), autoescape=True), col.is_(None))
+        if op in ("in", "not_in"):
+            values = _values(node)
+            clause = or_(*(_attr(key, v) == v for v in values))
+            return clause if op == "in" else not_(clause)
+        if op == "between":
+            lo, hi = _range(node)
+            return _between(_attr(key, lo if lo is not None else hi), lo, hi, lambda v: v)
+        return _compare(_attr(key, value), op, value, lambda v: v)
+
+    col = COLUMNS.get(field)
+    if col is None:
+        raise ValueError(f"unsupported field {field!r}")
+    convert = datetime.fromisoformat if field in DATE_FIELDS else (lambda v: v)
+    if op == "exists":
+        return col.is_not(None)
+    if op == "not_exists":
+        return col.is_(None)
+    if op in ("contains", "not_contains"):
+        clause = col.icontains(str(value), autoescape=True)
+        return clause if op == "contains" else not_(clause)
+    if op in ("in", "not_in"):
+        values = [convert(v) for v in _values(node)]
+        return col.in_(values) if op == "in" else col.not_in(values)
+    if op == "between":
+        lo, hi = _range(node)
+        return _between(col, lo, hi, convert)
+    return _compare(col, op, value, convert)
+
+def segment_filter(defn: dict) -> ColumnElement:
+    """WHERE clause for a definition tree (without the subscribed-only condition)."""
+    if not isinstance(defn, dict):
+        raise ValueError("segment definition must be an object")
+    if "filters" in defn:
+        t = str(defn.get("op", "AND")).upper()
+        if t not in GROUP_OPS:
+            raise ValueError(f"unsupported group op {t!r}")
+        parts = [segment_filter(n) for n in defn["filters"]]
+        if t == "NOT":
+            # a group that is unknown (NULL: compared attribute missing) counts as not matched,
+            # so its negation matches, like neq and not_contains
+            return not_(func.coalesce(and_(*parts), false())) if parts else false()
+        if not parts:  # empty AND matches everyone, empty OR no one
+            return true() if t == "AND" else false()
+        return and_(*parts) if t == "AND" else or_(*parts)
+    return _leaf(defn)
+
+def referenced_fields(defn: dict) -> set[str]:
+    """Fields a definition filters on, e.g. {"tags", "attributes.plan"}."""
+    if "filters" in defn:
+        return set().union(*(referenced_fields(n) for n in defn["filters"]))
+    return {defn["field"]} if defn.get("field") else set()
+
+def canonical(defn: dict) -> str:
+    return json.dumps(defn, sort_keys=True, separators=(",", ":"), default=str)
+
+def definition_hash(defn: dict) -> str:
+    """Stable key for a definition: equal trees hash equal regardless of key order."""
+    return hashlib.sha256(canonical(defn).encode()).hexdigest()
+
+# Compiled statements keyed by definition hash. Select objects are immutable, so
+# callers can share them, and reusing the same object lets SQLAlchemy's
+# compiled cache skip SQL generation on repeat executions too.
+PLAN_CACHE_MAX = 512
+_plans: "OrderedDict[str, Select]" = OrderedDict()
+_plans_lock = threading.Lock()
+
+def compile_segment(defn: dict) -> Select:
+    """``SELECT contact.id`` for subscribed contacts matching the definition; raises ValueError if invalid."""
+    key = definition_hash(defn)
+    with _plans_lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return plan
+    plan = select(Contact.id).where(Contact.status == "subscribed", segment_filter(defn))
+    with _plans_lock:
+        _plans[key] = plan
+        if len(_plans) > PLAN_CACHE_MAX:
+            _plans.popitem(last=False)
+    return plan
@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+from typing import Iterable
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from ..config import settings
+from ..models import Contact, Segment, SegmentMembership
+from . import bitmap
+from .compiler import compile_segment, referenced_fields
+
+# segment_membership holds (segment_id, contact_id) for every materialized segment.
+# materialize rebuilds one segment with a single INSERT ... SELECT; refresh_contacts
+# re-evaluates just the given contacts against the segments whose filters cover
+# the fields that changed, so contact writes keep memberships (and the in-process
+# bitmap index) current.
+
+REFRESH_CHUNK = 1000
+
+def _insert_members(db: Session, segment_id: int, stmt: Select) -> int:
+    ids = stmt.subquery()
+    res = db.execute(insert(SegmentMembership).from_select(
+        ["segment_id", "contact_id"], select(literal(segment_id), ids.c.id)
+    ))
+    return res.rowcount
+
+def materialize(db: Session, segment: Segment) -> int:
+    """Rebuild a segment's membership and stamp ``materialized_at``; returns the member count."""
+    db.execute(delete(SegmentMembership).where(SegmentMembership.segment_id == segment.id))
+    count = _insert_members(db, segment.id, compile_segment(segment.definition))
+    segment.materialized_at = datetime.now(timezone.utc)
+    db.commit()
+    return count
+
+def invalidate(db: Session, segment: Segment):
+    """Drop a segment's membership (e.g. its definition changed); the caller commits."""
+    db.execute(delete(SegmentMembership).where(SegmentMembership.segment_id == segment.id))
+    segment.materialized_at = None
+
+def is_fresh(segment: Segment) -> bool:
+    at = segment.materialized_at
+    if at is None:
+        return False
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - at).total_seconds() < settings.segment_max_age
+
+def _touches(defn: dict, changed: set[str]) -> bool:
+    # every compiled segment filters on status, so a status change touches them all
+    if "status" in changed:
+        return True
+    return any(f in changed or (f.startswith("attributes.") and "attributes" in changed) for f in referenced_fields(defn))
+
+def refresh_contacts(db: Session, contact_ids: Iterable[int], changed: set[str] | None = None) -> int:
+    """Re-evaluate contacts against materialized segments and commit; returns how many segments were touched.
+
+    ``changed`` names the fields that were written ("email", "status", "tags",
+    "attributes" or "attributes.<key>"); None means the contacts are new or
+    everything may have changed.
+    """
+    ids = list(contact_ids)
+    if not ids:
+        return 0
+    if changed is None or changed & {"status", "tags", "attributes"} or any(f.startswith("attributes.") for f in changed):
+        bitmap.contacts_changed(ids)
+    segments = db.execute(select(Segment).where(Segment.materialized_at.is_not(None))).scalars().all()
+    affected = [s for s in segments if changed is None or _touches(s.definition, changed)]
+    for segment in affected:
+        stmt = compile_segment(segment.definition)
+        for i in range(0, len(ids), REFRESH_CHUNK):
+            chunk = ids[i:i + REFRESH_CHUNK]
+            db.execute(delete(SegmentMembership).where(
+                SegmentMembership.segment_id == segment.id, SegmentMembership.contact_id.in_(chunk)
+            ))
+            _insert_members(db, segment.id, stmt.where(Contact.id.in_(chunk)))
+    db.commit()
+    return len(affected)
+
+def members(segment_id: int) -> Select:
+    """``SELECT contact.id`` over a segment's materialized membership (a primary-key range scan)."""
+    return (select(Contact.id)
+            .join(SegmentMembership, SegmentMembership.contact_id == Contact.id)
+            .where(SegmentMembership.segment_id == segment_id))
+
+def recipients(segment: Segment) -> Select:
+    """Statement listing a segment's contacts: the materialized set when fresh, else the compiled filter."""
+    return members(segment.id) if is_fresh(segment) else compile_segment(segment.definition)
@@ -0,0 +1,144 @@
+import asyncio, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Container
+from sqlalchemy import exists, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from ..email.base import EmailProvider, Message, SendResult
+from ..email.ratelimit import RateLimiter
+from .results import ResultWriter
+from ..models import CampaignRecipient, Contact, EmailSend
+from ..templating.compiled import CompiledTemplate, contact_context
+
+def async_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver (psycopg 3 async / aiosqlite)."""
+    for sync, aio in (("postgresql+psycopg2://", "postgresql+psycopg://"), ("postgresql://", "postgresql+psycopg://"),
+                      ("sqlite://", "sqlite+aiosqlite://")):
+        if url.startswith(sync):
+            return aio + url[len(sync):]
+    return url
+
+def by_domain(recipients) -> dict[str, list]:
+    groups: dict[str, list] = {}
+    for rcpt in recipients:
+        groups.setdefault(rcpt[1].rpartition("@")[2].lower(), []).append(rcpt)
+    return groups
+
+def unsent(campaign_id: int):
+    """Filter for contacts with no ``email_send`` row in the campaign yet (the idempotency guard)."""
+    return ~exists().where(EmailSend.campaign_id == campaign_id, EmailSend.contact_id == Contact.id)
+
+def email_send_row(campaign_id: int, contact_id: int, provider: str, r: SendResult) -> dict:
+    return {"campaign_id": campaign_id, "contact_id": contact_id, "provider": provider,
+            "message_id": r.message_id, "status": "sent" if r.ok else "failed", "error": r.error}
+
+def suppressed_row(campaign_id: int, contact_id: int, provider: str) -> dict:
+    return {"campaign_id": campaign_id, "contact_id": contact_id, "provider": provider,
+            "message_id": None, "status": "suppressed", "error": None}
+
+def split_suppressed(campaign_id: int, provider: str, recipients, suppressed: Container[str] | None) -> tuple[list, list[dict]]:
+    """Drop recipients on the suppression list; returns (still to send, their ``suppressed`` rows)."""
+    if suppressed is None:
+        return list(recipients), []
+    keep, rows = [], []
+    for rcpt in recipients:
+        if rcpt[1] in suppressed:
+            rows.append(suppressed_row(campaign_id, rcpt[0], provider))
+        else:
+            keep.append(rcpt)
+    return keep, rows
+
+class AsyncSendEngine:
+    """Sends recipient batches with provider calls overlapped under a bounded in-flight limit.
+
+    The engine owns an event loop on a daemon thread, so synchronous RQ jobs
+    submit work through ``run``. Recipients are read through an async session
+    and ``email_send`` rows go to the shared ``ResultWriter`` when given (else
+    one async insert per batch); provider and rate-limiter calls are blocking
+    and run on a thread pool, at most ``concurrency`` slices at once.
+    Recipients found in ``suppressed`` are recorded without a provider call.
+    """
+
+    def __init__(self, database_url: str, provider: EmailProvider, limiter: RateLimiter | None = None,
+                 concurrency: int = 16, slice_size: int = 50, throttle_retries: int = 3,
+                 writer: ResultWriter | None = None, suppressed: Container[str] | None = None):
+        self.provider, self.limiter, self.writer, self.suppressed = provider, limiter, writer, suppressed
+        self.slice_size, self.throttle_retries = slice_size, throttle_retries
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="send-engine", daemon=True).start()
+        # limiter waits sleep in threads too, so leave room beyond the in-flight sends
+        self.executor = ThreadPoolExecutor(concurrency * 2, thread_name_prefix="send")
+        self.inflight = asyncio.Semaphore(concurrency)
+        self.db = create_async_engine(async_url(database_url))
+        self.Session = async_sessionmaker(self.db, expire_on_commit=False)
+
+    def run(self, campaign_id: int, contact_ids: list[int], tpl: CompiledTemplate, subject: str,
+            on_done: Callable[[], None] | None = None) -> list[dict]:
+        return asyncio.run_coroutine_threadsafe(self.send(campaign_id, contact_ids, tpl, subject, on_done), self.loop).result()
+
+    async def _call(self, fn, *args):
+        return await self.loop.run_in_executor(self.executor, fn, *args)
+
+    async def send(self, campaign_id: int, contact_ids: list[int], tpl: CompiledTemplate, subject: str,
+                   on_done: Callable[[], None] | None = None) -> list[dict]:
+        async with self.Session() as s:
+            contacts = (await s.execute(
+                select(Contact.id, Contact.email, Contact.attributes, Contact.tags, CampaignRecipient.token)
+                .join(CampaignRecipient, (CampaignRecipient.contact_id == Contact.id) & (CampaignRecipient.campaign_id == campaign_id))
+                .where(Contact.id.in_(contact_ids), unsent(campaign_id))
+            )).all()
+        recipients, skipped = split_suppressed(campaign_id, self.provider.name, (
+            (cid, email, contact_context(email, attrs, tags, token=token)) for cid, email, attrs, tags, token in contacts
+        ), self.suppressed)
+        groups = await asyncio.gather(*(
+            self._send_domain(campaign_id, domain, rcpts, tpl, subject) for domain, rcpts in by_domain(recipients).items()
+        ))
+        rows = skipped + [row for group in groups for row in group]
+        await self.write(rows, on_done)
+        return rows
+
+    async def write(self, rows: list[dict], on_done: Callable[[], None] | None = None):
+        if self.writer:
+            await self._call(self.writer.add, rows, on_done)  # may block on a full buffer
+            return
+        if rows:
+            async with self.Session() as s:
+                await s.execute(insert(EmailSend), rows)
+                await s.commit()
+        if on_done:
+            on_done()
+
+    async def _send_slice(self, part: list, tpl: CompiledTemplate, subject: str):
+        try:
+            msgs = [Message(email, subject, tpl.source, template_data=ctx) for (_, email, ctx), _ in part]
+            return part, await self._call(self.provider.send_batch, msgs)
+        finally:
+            self.inflight.release()
+
+    async def _send_domain(self, campaign_id: int, domain: str, recipients: list, tpl: CompiledTemplate, subject: str) -> list[dict]:
+        pending = [(rcpt, 0) for rcpt in recipients]
+        rows, tasks = [], set()
+        while pending or tasks:
+            if pending:
+                await self.inflight.acquire()
+                want = min(len(pending), self.slice_size)
+                n = await self._call(self.limiter.acquire, domain, want) if self.limiter else want
+                part, pending = pending[:n], pending[n:]
+                tasks.add(asyncio.ensure_future(self._send_slice(part, tpl, subject)))
+                if pending:
+                    continue  # keep the pipeline full before collecting results
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                part, results = t.result()
+                if self.limiter and any(r.throttled for r in results):
+                    self.limiter.penalize(domain)
+                for (rcpt, tries), r in zip(part, results):
+                    if r.throttled and tries < self.throttle_retries:
+                        pending.append((rcpt, tries + 1))
+                    else:
+                        rows.append(email_send_row(campaign_id, rcpt[0], self.provider.name, r))
+        return rows
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.db.dispose(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
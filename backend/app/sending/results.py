@@ -0,0 +1,139 @@
+import atexit, logging, threading, time
+from collections import deque
+from typing import Callable
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from ..models import EmailSend
+
+log = logging.getLogger(__name__)
+
+def insert_sends(dialect: str):
+    """INSERT for email_send that skips rows already recorded for (campaign_id, contact_id).
+
+    Where supported the statement returns the rows it actually inserted.
+    """
+    for name, mod in (("postgresql", postgresql), ("sqlite", sqlite)):
+        if dialect == name:
+            return (mod.insert(EmailSend).on_conflict_do_nothing(index_elements=["campaign_id", "contact_id"])
+                    .returning(EmailSend.campaign_id, EmailSend.contact_id, EmailSend.status))
+    return insert(EmailSend)
+
+class ResultWriter:
+    """Write-behind buffer for ``email_send`` rows.
+
+    Rows accumulate in memory and a background thread flushes them with one
+    multi-row INSERT every ``max_rows`` rows or ``max_delay`` seconds,
+    whichever comes first. ``add`` blocks once ``max_buffer`` rows are pending,
+    so a slow database applies backpressure instead of growing memory.
+    ``close`` (registered atexit) flushes whatever is left. ``on_flush`` runs
+    with the rows each batch inserted after it commits, e.g. to bump progress counters, and an
+    ``on_done`` passed to ``add`` runs once all of that call's rows are written.
+    Rows are written in the order they were added.
+    """
+
+    def __init__(self, engine: Engine, max_rows: int = 500, max_delay: float = 0.25, max_buffer: int = 10000,
+                 on_flush: Callable[[list[dict]], None] | None = None, max_retries: int = 5):
+        self.engine, self.on_flush = engine, on_flush
+        self.max_rows, self.max_delay, self.max_buffer, self.max_retries = max_rows, max_delay, max_buffer, max_retries
+        self._rows: list[dict] = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # one batch in flight keeps commits in add order
+        self._added = self._written = self._lost = 0  # row counts marking progress through the stream
+        self._waiters: deque[tuple[int, int, Callable[[], None]]] = deque()  # (first row, end row, on_done)
+        self._insert = insert_sends(engine.dialect.name)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, rows: list[dict], on_done: Callable[[], None] | None = None):
+        with self._cond:
+            while len(self._rows) >= self.max_buffer and not self._closed:
+                self._cond.wait()
+            start = self._added
+            self._rows.extend(rows)
+            self._added += len(rows)
+            if on_done:
+                self._waiters.append((start, self._added, on_done))
+            if len(self._rows) >= self.max_rows:
+                self._cond.notify_all()
+        if on_done and not rows:
+            self._notify()
+
+    def _take(self) -> list[dict]:
+        batch, self._rows = self._rows[:self.max_rows], self._rows[self.max_rows:]
+        self._cond.notify_all()  # wake producers blocked on a full buffer
+        return batch
+
+    def _notify(self):
+        ready = []
+        with self._cond:
+            while self._waiters and self._waiters[0][1] <= self._written:
+                start, _, fn = self._waiters.popleft()
+                if start >= self._lost:  # none of its rows were dropped
+                    ready.append(fn)
+        for fn in ready:
+            try:
+                fn()
+            except Exception:
+                log.exception("email_send on_done callback failed")
+
+    def _write(self, batch: list[dict]):
+        ok, inserted = False, batch
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                with self.engine.begin() as conn:
+                    res = conn.execute(self._insert.values(batch))
+                    if res.returns_rows:  # duplicates were skipped; count only what landed
+                        inserted = [dict(row._mapping) for row in res]
+                ok = True
+                break
+            except Exception:
+                log.exception("email_send flush of %d rows failed (attempt %d)", len(batch), attempt)
+                if attempt == self.max_retries:
+                    break
+                time.sleep(self.max_delay * attempt)
+        with self._cond:
+            self._written += len(batch)
+            if not ok:
+                self._lost = self._written
+        if ok and self.on_flush:
+            self.on_flush(inserted)
+        self._notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.max_delay
+                while len(self._rows) < self.max_rows and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed and not self._rows:
+                    return
+            with self._write_lock:
+                with self._cond:
+                    batch = self._take()
+                if batch:
+                    self._write(batch)
+
+    def flush(self):
+        """Synchronously write everything buffered so far."""
+        while True:
+            with self._write_lock:
+                with self._cond:
+                    batch = self._take()
+                if not batch:
+                    return
+                self._write(batch)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
@@ -0,0 +1,134 @@
+"""Worker entry point that runs a pool of RQ send processes in one container.
+
+``python -m app.sending.supervisor`` forks WORKER_PROCESSES children (default:
+one per core), each running an ``app.queues.ShardWorker`` over ``app.queues.worker_queues()``.
+The parent never imports the job module, so every child builds its own DB
+engine, Redis client, provider sessions and background threads after the fork.
+Children that die are restarted with backoff; SIGTERM/SIGINT is forwarded so
+each child finishes its current job and flushes buffered results before the
+parent exits, and a throughput line per child is logged every REPORT_INTERVAL.
+"""
+import importlib, logging, os, signal, socket, sys, time
+from redis import Redis
+from ..config import settings
+from .. import queues
+
+log = logging.getLogger("supervisor")
+
+JOB_MODULE = "app.tasks_worker"
+# Messages written per process: "<host>:<pid>" -> count, bumped by the job module on every flush
+STATS_KEY = "workers:throughput"
+REPORT_INTERVAL = float(os.getenv("WORKER_REPORT_S", "30"))
+DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT_S", "120"))
+HOST = socket.gethostname()
+
+def record(r, messages: int):
+    r.hincrby(STATS_KEY, f"{HOST}:{os.getpid()}", messages)
+
+def _child(names: list[str]) -> int:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    from rq import Queue
+    jobs = None
+    try:
+        jobs = importlib.import_module(JOB_MODULE)  # engine, pools and threads start here, post-fork
+        conn = Redis.from_url(settings.redis_url or "redis://localhost:6379/0")
+        worker = queues.ShardWorker([Queue(n, connection=conn) for n in names], connection=conn)
+        worker.work(with_scheduler=True)  # RQ turns SIGTERM into a warm shutdown
+        return 0
+    except Exception:
+        log.exception("worker %s crashed", os.getpid())
+        return 1
+    finally:
+        if jobs is not None:
+            jobs.shutdown()
+
+class Supervisor:
+    def __init__(self, processes: int, names: list[str]):
+        self.processes, self.names = processes, names
+        self.children: dict[int, tuple[int, float]] = {}  # pid -> (slot, started at)
+        self.failures = [0] * processes
+        self.stopping = False
+        self.r = Redis.from_url(settings.redis_url or "redis://localhost:6379/0")
+        self._last: dict[int, tuple[float, int]] = {}  # pid -> (time, messages) at the last report
+
+    def spawn(self, slot: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = _child(self.names)
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        self.children[pid] = (slot, time.monotonic())
+        log.info("started worker %s in slot %s", pid, slot)
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot, started = self.children.pop(pid)
+            self.r.hdel(STATS_KEY, f"{HOST}:{pid}")
+            self._last.pop(pid, None)
+            if self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            # quick deaths back off so a broken deploy does not fork in a tight loop
+            self.failures[slot] = self.failures[slot] + 1 if time.monotonic() - started < 10 else 0
+            delay = min(2 ** self.failures[slot], 30) if self.failures[slot] else 0
+            log.warning("worker %s (slot %s) exited with %s; restarting in %ss", pid, slot, code, delay)
+            time.sleep(delay)
+            if not self.stopping:
+                self.spawn(slot)
+
+    def report(self):
+        now = time.monotonic()
+        counts = {k.decode(): int(v) for k, v in self.r.hgetall(STATS_KEY).items()}
+        total = 0.0
+        for pid, (slot, _) in sorted(self.children.items(), key=lambda c: c[1][0]):
+            sent = counts.get(f"{HOST}:{pid}", 0)
+            then, before = self._last.get(pid, (now - REPORT_INTERVAL, 0))
+            rate = (sent - before) / max(now - then, 1e-9)
+            total += rate
+            self._last[pid] = (now, sent)
+            log.info("slot %s pid %s: %d messages, %.1f msg/s", slot, pid, sent, rate)
+        log.info("%d workers: %.1f msg/s", len(self.children), total)
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for slot in range(self.processes):
+            self.spawn(slot)
+        next_report = time.monotonic() + REPORT_INTERVAL
+        while not self.stopping:
+            self.reap()
+            if time.monotonic() >= next_report:
+                self.report()
+                next_report += REPORT_INTERVAL
+            time.sleep(0.5)
+        return self.drain()
+
+    def drain(self) -> int:
+        log.info("draining %d workers", len(self.children))
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.2)
+        for pid in self.children:
+            log.warning("worker %s did not drain in time; killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+        return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    sys.exit(Supervisor(int(os.getenv("WORKER_PROCESSES") or 0) or os.cpu_count() or 1, queues.worker_queues()).run())
@@ -0,0 +1,63 @@
+import logging, threading, time
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from ..models import Suppression
+
+log = logging.getLogger(__name__)
+
+# Publishes a suppressed address, or "*" to ask every worker for a full reload
+CHANNEL = "suppression:changed"
+
+def suppress(db: Session, r, email: str, reason: str) -> bool:
+    """Add an address to the suppression list and notify workers; False if it was already there."""
+    email = email.strip().lower()
+    added = db.execute(select(Suppression.id).where(Suppression.email == email)).first() is None
+    if added:
+        db.add(Suppression(email=email, reason=reason))
+        db.commit()
+    r.publish(CHANNEL, email)
+    return added
+
+class SuppressionSet:
+    """In-process membership set of suppressed addresses for O(1) checks at send time.
+
+    Loaded from the ``suppression`` table, reloaded every ``refresh_interval``
+    seconds, and updated live from the Redis pub/sub ``CHANNEL`` so bounces and
+    complaints recorded mid-campaign are skipped without a per-message query.
+    """
+
+    def __init__(self, engine: Engine, r, refresh_interval: float = 300.0):
+        self.engine, self.r, self.refresh_interval = engine, r, refresh_interval
+        self._emails: set[str] = set()
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        threading.Thread(target=self._listen, name="suppression-listener", daemon=True).start()
+
+    def refresh(self):
+        with self.engine.connect() as conn:
+            emails = {e.lower() for e in conn.execute(select(Suppression.email)).scalars()}
+        with self._lock:
+            self._emails, self._loaded_at = emails, time.monotonic()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for msg in pubsub.listen():
+                    email = msg["data"].decode() if isinstance(msg["data"], bytes) else str(msg["data"])
+                    if email == "*":
+                        self._loaded_at = 0.0
+                    else:
+                        with self._lock:
+                            self._emails.add(email.lower())
+            except Exception:
+                log.exception("suppression listener lost its connection; reconnecting")
+                self._loaded_at = 0.0  # may have missed messages
+                time.sleep(1)
+
+    def __contains__(self, email: str) -> bool:
+        if time.monotonic() - self._loaded_at > self.refresh_interval:
+            self.refresh()
+        return email.lower() in self._emails
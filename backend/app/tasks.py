@@ -1,21 +1,253 @@
 import os, uuid
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import Sequence
 from redis import Redis
 from rq import Queue
+from rq.job import Job, JobStatus
+from sqlalchemy import String, Select, and_, cast, exists, func, insert, literal, select, update
 from sqlalchemy.orm import Session
-from .models import CampaignRecipient, Contact
+from .models import Campaign, CampaignRecipient, Contact, Segment, Suppression
 from .config import settings
+from .db import SessionLocal
+from .segments import membership
+from . import checkpoints, progress, queues
 
 # Use settings with fallback for Redis URL
 redis_url = settings.redis_url or "redis://localhost:6379/0"
 redis = Redis.from_url(redis_url)
-queue = Queue("send", connection=redis)
+schedule_queue = Queue(queues.SCHEDULE, connection=redis)
 
-def snapshot_recipients(db: Session, campaign_id: int, contact_ids: List[int]):
-    for cid in contact_ids:
-        cr = CampaignRecipient(campaign_id=campaign_id, contact_id=cid, token=str(uuid.uuid4()))
-        db.add(cr)
+SEND_BATCH = "app.tasks_worker.send_batch"
+SEND_TRANSACTIONAL = "app.tasks_worker.send_transactional"
+INSERT_CHUNK = 5000
+# Send-batch chunks enqueued per Redis pipeline round-trip
+PIPELINE_CHUNKS = 50
+
+def chunked(items: Sequence, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def unsuppressed(stmt: Select) -> Select:
+    """Add an anti-join against the suppression list to a compiled segment (a SELECT over contact)."""
+    return stmt.where(~exists().where(Suppression.email == func.lower(Contact.email)))
+
+def by_shard(recipients) -> dict[str, list[int]]:
+    """Group (contact_id, email) rows by bulk queue shard, keeping their order."""
+    groups: dict[str, list[int]] = {}
+    for contact_id, email in recipients:
+        groups.setdefault(queues.shard_for(email), []).append(contact_id)
+    return groups
+
+def in_shard(shard: str):
+    """Filter on Contact for recipients that belong to a bulk queue shard."""
+    if shard:
+        return Contact.email.ilike(f"%@{shard}")
+    return and_(*(~Contact.email.ilike(f"%@{d}") for d in queues.bulk_shards()))
+
+def enqueue_transactional(to_email: str, subject: str, html: str, text: str | None = None):
+    """Queue a one-off message (password reset, receipts...) ahead of all bulk traffic."""
+    return queues.get_queue(queues.TRANSACTIONAL).enqueue(SEND_TRANSACTIONAL, to_email, subject, html, text)
+
+def enqueue_batches(campaign_id: int, contact_ids: Sequence[int], batch_size: int | None = None,
+                    delay: float = 0.0, spacing: float = 0.0, shard: str = "") -> int:
+    """Enqueue one ``send_batch`` job per chunk of ascending contact ids in a single pipeline round-trip.
+
+    Jobs go to the bulk queue for ``shard`` (see ``app.queues``). Each chunk is
+    registered as a checkpoint so ``resume_campaign`` can find it again.
+    With ``delay``/``spacing`` (seconds) chunk k is released by the RQ scheduler at
+    now + delay + k * spacing instead of straight away, staggering the campaign.
+    """
+    size = batch_size or settings.send_batch_size
+    queue = queues.get_queue(queues.bulk_queue_name(shard))
+    chunks = list(chunked(contact_ids, size))
+    with redis.pipeline() as pipe:
+        for chunk in chunks:
+            checkpoints.add_chunk(pipe, campaign_id, chunk[0], chunk[-1], shard)
+        if delay or spacing:
+            now = datetime.now(timezone.utc)
+            for k, chunk in enumerate(chunks):
+                job = queue.create_job(SEND_BATCH, args=(campaign_id, list(chunk)), job_id=checkpoints.job_id(campaign_id, chunk[0]))
+                queue.schedule_job(job, now + timedelta(seconds=delay + k * spacing), pipeline=pipe)
+        else:
+            queue.enqueue_many([
+                Queue.prepare_data(SEND_BATCH, args=(campaign_id, list(chunk)), job_id=checkpoints.job_id(campaign_id, chunk[0]))
+                for chunk in chunks
+            ], pipeline=pipe)
+        progress.incr(pipe, campaign_id, "enqueued", len(chunks))
+        pipe.execute()
+    return len(chunks)
+
+def snapshot_segment(db: Session, campaign_id: int, stmt: Select) -> int:
+    """Insert every unsuppressed contact matched by a compiled segment as a recipient, returning the count.
+
+    On Postgres this is a single ``INSERT ... SELECT`` with tokens from
+    ``gen_random_uuid()``, so no ids ever reach this process. Other backends
+    stream ids through a server-side cursor and insert them in fixed chunks.
+    """
+    stmt = unsuppressed(stmt)
+    if db.get_bind().dialect.name == "postgresql":
+        seg = stmt.subquery()
+        res = db.execute(insert(CampaignRecipient).from_select(
+            ["campaign_id", "contact_id", "token"],
+            select(literal(campaign_id), seg.c.id, cast(func.gen_random_uuid(), String)),
+        ))
+        db.commit()
+        return res.rowcount
+
+    total = 0
+    result = db.execute(stmt, execution_options={"stream_results": True})
+    for part in result.partitions(INSERT_CHUNK):
+        db.execute(insert(CampaignRecipient), [
+            {"campaign_id": campaign_id, "contact_id": row[0], "token": str(uuid.uuid4())} for row in part
+        ])
+        total += len(part)
     db.commit()
+    return total
+
+def enqueue_recipients(db: Session, campaign_id: int, batch_size: int | None = None, after: int = 0,
+                       window: float = 0.0, total: int = 0) -> int:
+    """Enqueue ``send_batch`` jobs for a snapshotted campaign by keyset-paging ``campaign_recipient``.
+
+    Each page is split by bulk queue shard before chunking. A ``window``
+    (seconds) spreads the chunks of ``total`` recipients evenly over that span.
+    """
+    size = batch_size or settings.send_batch_size
+    spacing = window / max(-(-total // size), 1) if window else 0.0
+    last, jobs = after, 0
+    while True:
+        rows = db.execute(
+            select(CampaignRecipient.contact_id, Contact.email)
+            .join(Contact, Contact.id == CampaignRecipient.contact_id)
+            .where(CampaignRecipient.campaign_id == campaign_id, CampaignRecipient.contact_id > last)
+            .order_by(CampaignRecipient.contact_id)
+            .limit(size * PIPELINE_CHUNKS)
+        ).all()
+        if not rows:
+            return jobs
+        for shard, ids in by_shard(rows).items():
+            jobs += enqueue_batches(campaign_id, ids, size, delay=jobs * spacing, spacing=spacing, shard=shard)
+        last = rows[-1][0]
+
+# Campaigns that have not started sending yet, or whose start failed
+STARTABLE = ("draft", "scheduled", "failed")
+
+def _set_status(db: Session, campaign_id: int, current: str, status: str, *conditions) -> bool:
+    """Compare-and-set a campaign's status and commit; False if it was no longer ``current``."""
+    changed = db.execute(
+        update(Campaign)
+        .where(Campaign.id == campaign_id, Campaign.status == current, *conditions)
+        .values(status=status)
+        .execution_options(synchronize_session=False)  # the commit expires loaded campaigns
+    ).rowcount
+    db.commit()
+    return bool(changed)
+
+def start_campaign(db: Session, campaign_id: int, *conditions) -> str | None:
+    """Move a draft or scheduled campaign to ``scheduling`` and queue its send; returns the job id.
+
+    The status change is conditional (plus any extra ``conditions`` on Campaign),
+    so a campaign starts at most once: None means it was not startable. A fresh
+    campaign gets new progress and checkpoints and ``run_schedule``; one that
+    already has a recipient snapshot keeps them and goes through ``resume_campaign``.
+    If the job cannot be queued the campaign goes back to its old status and the
+    error is raised.
+    """
+    campaign = db.get(Campaign, campaign_id)
+    if campaign is None or campaign.status not in STARTABLE:
+        return None
+    previous = campaign.status
+    if not _set_status(db, campaign_id, previous, "scheduling", *conditions):
+        return None
+    job_id = str(uuid.uuid4())
+    try:
+        if db.scalar(select(exists().where(CampaignRecipient.campaign_id == campaign_id))):
+            schedule_queue.enqueue(resume_campaign, campaign_id, job_id=job_id)
+        else:
+            progress.reset(redis, campaign_id, job_id)
+            checkpoints.reset(redis, campaign_id)
+            schedule_queue.enqueue(run_schedule, campaign_id, job_id=job_id)
+    except Exception:
+        # nothing was queued: hand the campaign back so it can be started again
+        db.rollback()
+        _set_status(db, campaign_id, "scheduling", previous)
+        raise
+    return job_id
+
+def run_schedule(campaign_id: int):
+    """Background job behind ``POST /campaigns/{cid}/schedule`` and the scheduler: snapshot, enqueue, report progress."""
+    db = SessionLocal()
+    try:
+        campaign = db.get(Campaign, campaign_id)
+        seg = db.get(Segment, campaign.segment_id) if campaign else None
+        if not seg:
+            raise ValueError(f"campaign {campaign_id} has no segment")
+        progress.set_state(redis, campaign_id, "snapshotting")
+        count = snapshot_segment(db, campaign_id, membership.recipients(seg))
+        progress.incr(redis, campaign_id, "snapshotted", count)
+        progress.set_state(redis, campaign_id, "enqueueing")
+        if count:
+            enqueue_recipients(db, campaign_id, window=campaign.send_window or 0, total=count)
+        campaign.status = "sending" if count else "sent"
+        db.commit()
+        progress.set_state(redis, campaign_id, campaign.status)
+        return count
+    except Exception as e:
+        db.rollback()
+        # out of scheduling, so it can be started again (resuming whatever was snapshotted)
+        _set_status(db, campaign_id, "scheduling", "failed")
+        progress.set_state(redis, campaign_id, "failed")
+        redis.hset(progress.progress_key(campaign_id), "error", str(e))
+        raise
+    finally:
+        db.close()
+
+# Chunks whose job is still waiting or running are left alone by resume
+LIVE_JOB_STATES = {JobStatus.QUEUED, JobStatus.STARTED, JobStatus.DEFERRED, JobStatus.SCHEDULED}
+
+def resume_campaign(campaign_id: int, batch_size: int | None = None) -> int:
+    """Re-enqueue only the unsent part of an interrupted campaign, returning the number of jobs.
 
-    for cid in contact_ids:
-        queue.enqueue("app.tasks_worker.send_one", campaign_id, cid)
+    Unfinished chunks come from the checkpoint hashes and are re-sent from their
+    cursor, on their shard's queue, unless their job is still queued, running or
+    finished; recipients past the last enqueued chunk (enqueueing was cut short)
+    are paged in as new chunks. Workers skip contacts that already have an
+    ``email_send`` row, so a chunk that was partly sent is not sent twice.
+    """
+    db = SessionLocal()
+    try:
+        pending, top = checkpoints.unfinished(redis, campaign_id)
+        ids = [checkpoints.job_id(campaign_id, lo) for lo, _, _, _ in pending]
+        states = {job.id: job.get_status() for job in Job.fetch_many(ids, connection=redis) if job}
+        jobs: dict[str, list] = {}
+        for (lo, hi, cursor, shard), job_id in zip(pending, ids):
+            if states.get(job_id) in LIVE_JOB_STATES:
+                continue
+            if states.get(job_id) == JobStatus.FINISHED:
+                # its messages went out; only the buffered rows are outstanding
+                checkpoints.advance(redis, campaign_id, lo, hi)
+                continue
+            rest = db.execute(
+                select(CampaignRecipient.contact_id)
+                .join(Contact, Contact.id == CampaignRecipient.contact_id)
+                .where(CampaignRecipient.campaign_id == campaign_id, CampaignRecipient.contact_id > cursor,
+                       CampaignRecipient.contact_id <= hi, in_shard(shard))
+                .order_by(CampaignRecipient.contact_id)
+            ).scalars().all()
+            if rest:
+                jobs.setdefault(queues.bulk_queue_name(shard), []).append(
+                    Queue.prepare_data(SEND_BATCH, args=(campaign_id, rest, lo), job_id=job_id))
+            else:
+                checkpoints.advance(redis, campaign_id, lo, hi)
+        with redis.pipeline() as pipe:
+            for name, batch in jobs.items():
+                queues.get_queue(name).enqueue_many(batch, pipeline=pipe)
+            progress.set_state(pipe, campaign_id, "sending")
+            pipe.execute()
+        count = sum(map(len, jobs.values())) + enqueue_recipients(db, campaign_id, batch_size, after=top)
+        campaign = db.get(Campaign, campaign_id)
+        if campaign and campaign.status != "sending":
+            campaign.status = "sending"
+            db.commit()
+        return count
+    finally:
+        db.close()
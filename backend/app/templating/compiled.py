@@ -0,0 +1,72 @@
+import re
+from functools import lru_cache
+from typing import Any
+
+# {{ path }} or {{ path | default }}; paths are dotted, e.g. {{attributes.first_name|there}}.
+# Values are HTML-escaped like Handlebars (which SES renders bulk templates with);
+# {{{ path }}} and the RAW_FIELDS are inserted as is.
+PLACEHOLDER = re.compile(r"\{\{(\{)?\s*([\w.]+)\s*(?:\|\s*(.*?)\s*)?\}\}(?(1)\})")
+RAW_FIELDS = {"token"}  # tracking tokens go into link URLs
+# Handlebars' escapeExpression table
+HTML_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;", "`": "&#x60;", "=": "&#x3D;"})
+
+def _strip_quotes(s: str) -> str:
+    if len(s) >= 2 and s[0] == s[-1] and s[0] in "\"'":
+        return s[1:-1]
+    return s
+
+class CompiledTemplate:
+    """A template parsed once into literal segments and placeholder slots.
+
+    Rendering copies the segment list, fills the slots and does a single join,
+    so per-recipient cost is O(slots + output) instead of one full-string
+    replace per variable.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.parts: list[str] = []
+        self.slots: list[tuple[int, tuple[str, ...], str, bool]] = []  # (part index, path, default, raw)
+        pos = 0
+        for m in PLACEHOLDER.finditer(source):
+            self.parts.append(source[pos:m.start()])
+            raw = bool(m.group(1)) or m.group(2) in RAW_FIELDS
+            self.slots.append((len(self.parts), tuple(m.group(2).split(".")), _strip_quotes(m.group(3) or ""), raw))
+            self.parts.append("")
+            pos = m.end()
+        self.parts.append(source[pos:])
+
+    @property
+    def has_defaults(self) -> bool:
+        return any(default for _, _, default, _ in self.slots)
+
+    @property
+    def fields(self) -> set[str]:
+        return {".".join(path) for _, path, _, _ in self.slots}
+
+    def render(self, context: dict[str, Any], escape: bool = False) -> str:
+        """Fill the slots from ``context``; ``escape`` HTML-escapes values (not defaults) for HTML bodies."""
+        parts = self.parts.copy()
+        for i, path, default, raw in self.slots:
+            value: Any = context
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+                if value is None:
+                    break
+            if value is None or value == "":
+                parts[i] = default
+            else:
+                parts[i] = str(value) if raw or not escape else str(value).translate(HTML_ESCAPES)
+        return "".join(parts)
+
+def raw_placeholders(source: str) -> str:
+    """Turn {{ path }} into {{{ path }}}, for parts Handlebars must not HTML-escape (subjects, plain text)."""
+    return PLACEHOLDER.sub(lambda m: m.group(0) if m.group(1) else "{" + m.group(0) + "}", source)
+
+@lru_cache(maxsize=256)
+def compile_template(source: str) -> CompiledTemplate:
+    return CompiledTemplate(source)
+
+def contact_context(email: str, attributes: dict | None = None, tags: list | None = None, **extra) -> dict[str, Any]:
+    """Variables available to a template for one contact: email, attributes.*, tags and any extras."""
+    return {"email": email, "attributes": attributes or {}, "tags": ", ".join(tags or []), **extra}
@@ -0,0 +1,37 @@
+import html as htmllib, re
+from ..config import settings
+
+# href="..." / href='...' on anchor tags
+HREF = re.compile(r"""(<a\b[^>]*?\bhref\s*=\s*)(["'])(.*?)\2""", re.IGNORECASE | re.DOTALL)
+UNTRACKED = ("mailto:", "tel:", "#")
+
+def rewrite_links(html: str, base_url: str | None = None, known: dict[str, int] | None = None) -> tuple[str, dict[int, str]]:
+    """Extract every trackable href once and point it at the click endpoint.
+
+    Returns the rewritten HTML and the link table for this content (link id -> URL).
+    Each href becomes ``{base}/t/r/{{token}}?l=<id>``, so per-recipient
+    rendering only fills the ``token`` slot. ``known`` is the campaign's
+    existing table (URL -> id): those URLs keep their ids and new ones get ids
+    past its highest, so an id never points at a different URL when the content
+    changes. Repeated URLs share an id. Links that are already personalized
+    (contain ``{{``) are left untouched.
+    """
+    base = (base_url or settings.api_origin).rstrip("/")
+    known = known or {}
+    links: dict[str, int] = {}
+    next_id = max(known.values(), default=0) + 1
+
+    def sub(m: re.Match) -> str:
+        nonlocal next_id
+        raw = m.group(3).strip()
+        if not raw or raw.startswith(UNTRACKED) or "{{" in raw:
+            return m.group(0)
+        url = htmllib.unescape(raw)
+        if url in known:
+            links[url] = known[url]
+        elif url not in links:
+            links[url], next_id = next_id, next_id + 1
+        return f"{m.group(1)}{m.group(2)}{base}/t/r/{{{{token}}}}?l={links[url]}{m.group(2)}"
+
+    out = HREF.sub(sub, html)
+    return out, {i: url for url, i in links.items()}
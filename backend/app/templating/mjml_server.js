@@ -0,0 +1,24 @@
+// Long-lived MJML renderer used by app/templating/pool.py.
+// Protocol: one JSON request per stdin line ({"id", "mjml"}),
+// one JSON response per stdout line ({"id", "html"} or {"id", "error"}).
+const readline = require("readline");
+const mjml2html = require("mjml");
+
+const rl = readline.createInterface({ input: process.stdin });
+
+rl.on("line", (line) => {
+  let req;
+  try {
+    req = JSON.parse(line);
+  } catch (e) {
+    return;
+  }
+  let res;
+  try {
+    const out = mjml2html(req.mjml, { validationLevel: "soft" });
+    res = { id: req.id, html: out.html };
+  } catch (e) {
+    res = { id: req.id, error: String((e && e.message) || e) };
+  }
+  process.stdout.write(JSON.stringify(res) + "\n");
+});
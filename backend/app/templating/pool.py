@@ -0,0 +1,105 @@
+import atexit, itertools, json, os, queue, shlex, subprocess, threading, time
+from ..config import settings
+
+SERVER_JS = os.path.join(os.path.dirname(__file__), "mjml_server.js")
+
+class RendererError(RuntimeError):
+    pass
+
+class _Renderer:
+    """One persistent renderer child speaking line-delimited JSON over stdin/stdout."""
+
+    def __init__(self, cmd: list[str]):
+        self.cmd = cmd
+        self._ids = itertools.count(1)
+        self._start()
+
+    def _start(self):
+        self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        # A reader thread turns stdout into a queue so reads can time out
+        self.lines: queue.Queue = queue.Queue()
+        threading.Thread(target=self._pump, args=(self.proc, self.lines), daemon=True).start()
+
+    @staticmethod
+    def _pump(proc, lines):
+        for line in proc.stdout:
+            lines.put(line)
+        lines.put(None)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.proc.kill()
+        self.proc.wait()
+
+    def restart(self):
+        self.kill()
+        self._start()
+
+    def render(self, mjml: str, timeout: float) -> str:
+        if not self.alive():
+            self.restart()
+        req_id = next(self._ids)
+        try:
+            self.proc.stdin.write(json.dumps({"id": req_id, "mjml": mjml}) + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            self.restart()
+            raise RendererError("renderer exited")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                line = self.lines.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.restart()
+                raise RendererError(f"render timed out after {timeout}s")
+            if line is None:
+                self.restart()
+                raise RendererError("renderer exited")
+            res = json.loads(line)
+            if res.get("id") != req_id:
+                continue  # late answer to a request that already timed out
+            if "error" in res:
+                raise RendererError(res["error"])
+            return res["html"]
+
+class MJMLRendererPool:
+    """Fixed-size pool of persistent renderer processes; each render borrows one child."""
+
+    def __init__(self, size: int | None = None, timeout: float | None = None, cmd: str | None = None):
+        self.timeout = timeout or settings.mjml_timeout
+        argv = shlex.split(cmd or settings.mjml_renderer_cmd or f"node {SERVER_JS}")
+        self._idle: queue.Queue = queue.Queue()
+        self._all = [_Renderer(argv) for _ in range(size or settings.mjml_pool_size)]
+        for r in self._all:
+            self._idle.put(r)
+
+    def render(self, mjml: str) -> str:
+        r = self._idle.get()
+        try:
+            try:
+                return r.render(mjml, self.timeout)
+            except RendererError as e:
+                if str(e) != "renderer exited":
+                    raise
+                return r.render(mjml, self.timeout)  # crashed child was restarted; retry once
+        finally:
+            self._idle.put(r)
+
+    def close(self):
+        for r in self._all:
+            r.kill()
+
+_pool: MJMLRendererPool | None = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> MJMLRendererPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = MJMLRendererPool()
+            atexit.register(_pool.close)
+        return _pool
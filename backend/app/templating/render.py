@@ -1,13 +1,22 @@
-import subprocess, tempfile, json
-
-# Requires node "mjml" CLI in the web image or mount; in dev you can swap with server-side mjml2html over HTTP.
-
-def render_mjml(mjml: str, vars: dict[str, str]) -> str:
-    # naive {{var}} replacement
-    for k, v in vars.items():
-        mjml = mjml.replace(f"{{{{{k}}}}}", str(v))
-    with tempfile.NamedTemporaryFile(suffix=".mjml", delete=False, mode="w") as f:
-        f.write(mjml)
-        path = f.name
-    out = subprocess.run(["npx", "mjml", path, "-s"], capture_output=True, text=True, check=True)
-    return out.stdout
\ No newline at end of file
+import hashlib
+from .pool import get_pool
+from .compiled import compile_template
+
+# Requires node with the "mjml" package resolvable (see mjml_server.js); renders go through a
+# pool of persistent renderer processes instead of an npx subprocess per call.
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def compile_mjml(mjml: str) -> str:
+    """MJML -> HTML. Recipient-independent, so callers compile once per campaign and cache by content_hash."""
+    return get_pool().render(mjml)
+
+def personalize(html: str, vars: dict) -> str:
+    # {{var}} / {{attributes.x|default}} substitution against a template parsed once and cached
+    return compile_template(html).render(vars, escape=True)
+
+def render_mjml(mjml: str, vars: dict | None = None) -> str:
+    """MJML -> HTML, personalized with ``vars`` when given; without them placeholders are kept."""
+    html = compile_mjml(mjml)
+    return html if vars is None else personalize(html, vars)
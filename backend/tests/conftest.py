@@ -0,0 +1,4 @@
+import os, tempfile
+
+# app.db builds its engine at import time, so point it at a throwaway SQLite file first
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
@@ -0,0 +1,38 @@
+import pytest
+from app.db import SessionLocal, engine
+from app.models import Base, Contact, Segment
+from app.segments import advisor
+
+SEGMENTS = {
+    "pro": {"field": "attributes.plan", "op": "eq", "value": "pro"},
+    "seniors": {"field": "attributes.age", "op": "gt", "value": 60},
+    "vip": {"op": "AND", "filters": [{"field": "attributes.vip", "op": "eq", "value": True},
+                                     {"field": "attributes.plan", "op": "in", "value": ["pro", "team"]}]},
+}
+
+@pytest.fixture
+def seeded():
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        db.add_all(Contact(email=f"u{i}@example.com",
+                           attributes={"plan": ("free", "pro", "team")[i % 3], "age": 18 + i % 70, "vip": i % 5 == 0})
+                   for i in range(500))
+        db.add_all(Segment(name=name, definition=defn) for name, defn in SEGMENTS.items())
+        db.commit()
+    yield
+    engine.dispose()
+
+def plans() -> dict[str, list[str]]:
+    with SessionLocal() as db:
+        return {s.name: advisor.explain(db, s) for s in db.query(Segment).all()}
+
+def test_proposed_indexes_end_full_scans(seeded, capsys):
+    assert all(advisor.full_scan(plan) for plan in plans().values())
+
+    advisor.main(["--min-segments", "1", "--apply", "--explain"])
+    out = capsys.readouterr().out
+    assert "created ix_contact_attr_age_float" in out
+    assert "full scan" not in out
+
+    for name, plan in plans().items():
+        assert not advisor.full_scan(plan), (name, plan)
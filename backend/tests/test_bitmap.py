@@ -0,0 +1,45 @@
+import pytest
+from app.db import SessionLocal, engine
+from app.models import Base, Contact
+from app.segments.bitmap import BitmapIndex
+from app.segments.compiler import compile_segment
+
+fakeredis = pytest.importorskip("fakeredis")
+
+PLAN_PRO = {"field": "attributes.plan", "op": "eq", "value": "pro"}
+VIP = {"field": "tags", "op": "contains", "value": "vip"}
+DEFINITIONS = [
+    {"op": "NOT", "filters": [PLAN_PRO]},
+    {"op": "NOT", "filters": [PLAN_PRO, VIP]},
+    {"op": "NOT", "filters": [{"op": "OR", "filters": [PLAN_PRO, VIP]}]},
+    {"op": "NOT", "filters": [{"field": "attributes.plan", "op": "in", "value": ["pro", "team"]}]},
+    {"op": "NOT", "filters": [{"field": "attributes.seats", "op": "eq", "value": 5}]},
+    {"op": "NOT", "filters": [{"op": "NOT", "filters": [PLAN_PRO]}]},
+    {"op": "NOT", "filters": [VIP]},
+    {"op": "NOT", "filters": []},
+    {"op": "OR", "filters": []},
+    {"field": "attributes.plan", "op": "neq", "value": "pro"},
+    {"field": "attributes.seats", "op": "in", "value": [5, 10]},
+    {"op": "AND", "filters": [VIP, {"field": "tags", "op": "not_in", "value": ["churned"]}]},
+]
+
+@pytest.fixture(scope="module")
+def index():
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        db.add_all([
+            Contact(email="pro@parity.test", attributes={"plan": "pro", "seats": 5}, tags=["vip"]),
+            Contact(email="free@parity.test", attributes={"plan": "free", "seats": "10"}, tags=[]),
+            Contact(email="bare@parity.test", attributes={}, tags=["vip", "churned"]),
+            Contact(email="none@parity.test", attributes=None, tags=None),
+            Contact(email="gone@parity.test", attributes={"plan": "team"}, tags=["vip"], status="unsubscribed"),
+        ])
+        db.commit()
+    return BitmapIndex(engine, fakeredis.FakeRedis())
+
+@pytest.mark.parametrize("defn", DEFINITIONS)
+def test_bitmap_matches_sql(index, defn):
+    hit = index.evaluate(defn)
+    assert hit is not None, "definition should be answered from the bitmaps"
+    with SessionLocal() as db:
+        assert set(hit) == set(db.execute(compile_segment(defn)).scalars())
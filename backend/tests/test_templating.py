@@ -0,0 +1,19 @@
+from app.email.base import Message, personalized
+from app.templating.compiled import compile_template, raw_placeholders
+
+CONTEXT = {"email": "o'neil@example.com", "attributes": {"name": '<b>Tom & "Jo"</b>'}, "token": "t0k"}
+
+def test_html_values_are_escaped_like_handlebars():
+    tpl = compile_template('<p>Hi {{attributes.name|there}} {{{attributes.name}}}</p><a href="/t/r/{{token}}">{{email}}</a>')
+    assert tpl.render(CONTEXT, escape=True) == (
+        '<p>Hi &lt;b&gt;Tom &amp; &quot;Jo&quot;&lt;/b&gt; <b>Tom & "Jo"</b></p>'
+        '<a href="/t/r/t0k">o&#x27;neil@example.com</a>')
+    assert tpl.render({"attributes": {}}, escape=True).startswith("<p>Hi there ")
+
+def test_only_the_html_part_is_escaped():
+    m = personalized(Message("to@example.com", "For {{attributes.name}}", "<p>{{attributes.name}}</p>",
+                             "Hi {{attributes.name}}", template_data=CONTEXT))
+    assert m.subject == 'For <b>Tom & "Jo"</b>'
+    assert m.text == 'Hi <b>Tom & "Jo"</b>'
+    assert m.html == "<p>&lt;b&gt;Tom &amp; &quot;Jo&quot;&lt;/b&gt;</p>"
+    assert raw_placeholders("For {{ attributes.name }} {{{email}}}") == "For {{{ attributes.name }}} {{{email}}}"
@@ -0,0 +1,86 @@
+import importlib.util, pathlib
+import pytest
+from fastapi.testclient import TestClient
+from app.db import SessionLocal, engine
+from app.models import Base, Campaign, CampaignRecipient, Contact, EmailSend, EmailTemplate, Segment
+from app.templating import render
+
+fakeredis = pytest.importorskip("fakeredis")
+WORKER = pathlib.Path(__file__).resolve().parents[2] / "worker" / "main.py"
+MJML = '<p>Hi {{attributes.first_name|there}} ({{email}})</p><a href="https://example.com/offer">Offer</a>'
+
+@pytest.fixture(scope="module")
+def client():
+    from app.main import app
+    return TestClient(app)
+
+@pytest.fixture(scope="module")
+def worker(client):
+    """worker/main.py loaded as in the image, on fakeredis and the fake provider, compiling through /render."""
+    import redis, requests
+
+    def post(url, json):
+        resp = client.post("/render", json=json)
+        resp.ok = resp.is_success  # the worker reads the requests attribute
+        return resp
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("EMAIL_PROVIDER", "fake")
+        mp.setattr(redis.Redis, "from_url", staticmethod(lambda *a, **k: fakeredis.FakeRedis()))
+        mp.setattr(render, "compile_mjml", lambda mjml: mjml)  # no node renderer here
+        mp.setattr(requests, "post", post)
+        spec = importlib.util.spec_from_file_location("app.tasks_worker", WORKER)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        yield module
+        module.shutdown()
+
+def campaign_for(db, emails: list[str], mjml: str = MJML, **attributes) -> tuple[int, list[int]]:
+    """A sending campaign with a snapshot of new contacts; returns (campaign id, contact ids)."""
+    template, segment = EmailTemplate(name="welcome", mjml=mjml), Segment(name="all", definition={})
+    db.add_all([template, segment])
+    db.flush()
+    campaign = Campaign(name="welcome", template_id=template.id, segment_id=segment.id, status="sending")
+    contacts = [Contact(email=e, attributes=attributes.get(e.partition("@")[0], {})) for e in emails]
+    db.add_all([campaign, *contacts])
+    db.flush()
+    db.add_all(CampaignRecipient(campaign_id=campaign.id, contact_id=c.id, token=f"tok-{c.id}") for c in contacts)
+    db.commit()
+    return campaign.id, [c.id for c in contacts]
+
+def sent_to(worker, email: str) -> str:
+    return [m.html for m in worker.get_provider("fake").sent if m.to_email == email][-1]
+
+def test_send_batch_personalizes_each_recipient(worker):
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        campaign_id, ids = campaign_for(db, ["ada@example.com", "bob@example.com"], ada={"first_name": "Ada"})
+
+    worker.send_batch(campaign_id, ids)
+    worker.writer.flush()
+
+    assert "Hi Ada (ada@example.com)" in sent_to(worker, "ada@example.com")
+    assert "Hi there (bob@example.com)" in sent_to(worker, "bob@example.com")
+    assert f"/t/r/tok-{ids[0]}?l=1" in sent_to(worker, "ada@example.com")
+    with SessionLocal() as db:
+        assert db.query(EmailSend).filter_by(campaign_id=campaign_id, status="sent").count() == 2
+
+def test_link_ids_survive_content_edits(worker, client):
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        campaign_id, (first, second) = campaign_for(db, ["cy@example.com", "di@example.com"],
+                                                    mjml='<a href="https://example.com/a">A</a>')
+    click = lambda contact_id, link_id: client.get(f"/t/r/tok-{contact_id}?l={link_id}",
+                                                   follow_redirects=False).headers["location"]
+
+    worker.send_batch(campaign_id, [first])
+    assert click(first, 1) == "https://example.com/a"
+    with SessionLocal() as db:
+        db.get(Campaign, campaign_id).custom_content = '<a href="https://example.com/b">B</a><a href="https://example.com/a">A</a>'
+        db.commit()
+    worker.send_batch(campaign_id, [second])
+
+    assert f"tok-{second}?l=2\">B" in sent_to(worker, "di@example.com")
+    assert f"tok-{second}?l=1\">A" in sent_to(worker, "di@example.com")
+    assert click(second, 2) == "https://example.com/b"
+    assert click(first, 1) == "https://example.com/a"
@@ -27,6 +27,8 @@ interface BulkUploadModalProps {
 interface UploadResult {
   message: string;
   created_count: number;
+  updated_count?: number;
+  skipped_count?: number;
   error_count: number;
   errors: string[];
 }
@@ -52,11 +54,11 @@ export function BulkUploadModal({ isOpen, onClose, onSuccess }: BulkUploadModalP
     if (!selectedFile) return;
 
     // Validate file type
-    const allowedTypes = ['.csv', '.xlsx', '.xls'];
+    const allowedTypes = ['.csv', '.xlsx'];
     const fileExtension = selectedFile.name.toLowerCase().substring(selectedFile.name.lastIndexOf('.'));
     
     if (!allowedTypes.includes(fileExtension)) {
-      setError('Please select a CSV or Excel file (.csv, .xlsx, .xls)');
+      setError('Please select a CSV or Excel file (.csv, .xlsx)');
       return;
     }
 
@@ -230,7 +232,7 @@ export function BulkUploadModal({ isOpen, onClose, onSuccess }: BulkUploadModalP
               <Input
                 id="file-upload"
                 type="file"
-                accept=".csv,.xlsx,.xls"
+                accept=".csv,.xlsx"
                 onChange={handleFileSelect}
                 ref={fileInputRef}
                 className="hidden"
@@ -247,7 +249,7 @@ export function BulkUploadModal({ isOpen, onClose, onSuccess }: BulkUploadModalP
                   </Button>
                 </div>
                 <p className="text-sm text-gray-500">
-                  Supported formats: CSV, Excel (.xlsx, .xls)
+                  Supported formats: CSV, Excel (.xlsx)
                 </p>
               </div>
             </div>
@@ -334,6 +336,8 @@ export function BulkUploadModal({ isOpen, onClose, onSuccess }: BulkUploadModalP
                   <p className="font-medium">{uploadResult.message}</p>
                   <p className="text-sm">
                     Created: {uploadResult.created_count} contacts
+                    {!!uploadResult.updated_count && <> • Updated: {uploadResult.updated_count}</>}
+                    {!!uploadResult.skipped_count && <> • Skipped: {uploadResult.skipped_count}</>}
                     {uploadResult.error_count > 0 && (
                       <span className="text-orange-600">
                         {' '}• Errors: {uploadResult.error_count}
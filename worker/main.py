@@ -1,45 +1,229 @@
 import os
-from sqlalchemy import create_engine, text
+from functools import partial
+from redis import Redis
+from sqlalchemy import create_engine, text, select, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
-import boto3, requests
+import requests
+from app import checkpoints, progress
+from app.email.base import Message
+from app.email.factory import get_provider
+from app.email.ratelimit import RateLimiter, parse_limits
+from app.models import Contact, CampaignRecipient, CampaignLink, EmailSend
+from app.sending.engine import AsyncSendEngine, by_domain, email_send_row, split_suppressed, unsent
+from app.sending.results import ResultWriter
+from app.sending.suppression import SuppressionSet
+from app.sending.supervisor import record
+from app.templating.render import content_hash
+from app.templating.compiled import CompiledTemplate, compile_template, contact_context
+from app.templating.links import rewrite_links
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 EMAIL_PROVIDER = os.getenv("EMAIL_PROVIDER", "ses")
-AWS_REGION = os.getenv("AWS_REGION", "ap-southeast-1")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMITS = parse_limits(os.getenv("RATE_LIMITS", ""))
+# Times a throttled message goes back through the limiter before it is recorded as failed
+THROTTLE_RETRIES = 3
+# Batches at least this large go through the asyncio engine; smaller ones send inline
+ASYNC_SEND_MIN = int(os.getenv("ASYNC_SEND_MIN", "50"))
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", "16"))
+# email_send rows are buffered and flushed every N rows or T milliseconds
+RESULT_FLUSH_ROWS = int(os.getenv("RESULT_FLUSH_ROWS", "500"))
+RESULT_FLUSH_MS = int(os.getenv("RESULT_FLUSH_MS", "250"))
+# Full reload interval for the in-memory suppression list (pub/sub keeps it fresh in between)
+SUPPRESSION_REFRESH_S = float(os.getenv("SUPPRESSION_REFRESH_S", "300"))
 
+# Everything below is per process: app.sending.supervisor imports this module only after fork
 engine = create_engine(DATABASE_URL)
 Session = sessionmaker(bind=engine)
+redis = Redis.from_url(REDIS_URL)
+suppressed = SuppressionSet(engine, redis, SUPPRESSION_REFRESH_S)
 
-# Minimal sending task used by app.tasks.snapshot_recipients
+SUBJECT = "Hello"
+# Campaign content: custom MJML wins over the template's
+CAMPAIGN_CONTENT = text("""
+    SELECT COALESCE(ca.custom_content, t.mjml)
+    FROM campaign AS ca
+    JOIN email_template t ON t.id = ca.template_id
+    WHERE ca.id = :caid
+""")
 
+# Compiled HTML keyed by content hash: per process, and in Redis so every worker shares it
+HTML_CACHE_TTL = 24 * 3600
+HTML_CACHE_MAX = 128
+_html_cache: dict[str, str] = {}
+
+def _compile(mjml: str) -> str:
+    h = content_hash(mjml)
+    html = _html_cache.get(h)
+    if html is not None:
+        return html
+    key = f"render:html:v2:{h}"  # v1 entries were compiled with empty vars
+    cached = redis.get(key)
+    if cached is not None:
+        html = cached.decode()
+    else:
+        # Compile via backend service (assuming api at http://api:8000) without vars, so the
+        # placeholders survive for per-recipient rendering. Falls back to raw content uncached.
+        r = requests.post("http://api:8000/render", json={"mjml": mjml})
+        if not r.ok:
+            return mjml
+        html = r.json()["html"]
+        redis.set(key, html, ex=HTML_CACHE_TTL)
+    if len(_html_cache) >= HTML_CACHE_MAX:
+        _html_cache.pop(next(iter(_html_cache)))
+    _html_cache[h] = html
+    return html
+
+# Per-campaign compiled template with tracked links, keyed by (campaign id, content hash)
+_tpl_cache: dict[tuple[int, str], CompiledTemplate] = {}
+
+def _campaign_template(s, campaign_id: int, mjml: str) -> CompiledTemplate:
+    key = (campaign_id, content_hash(mjml))
+    tpl = _tpl_cache.get(key)
+    if tpl is not None:
+        return tpl
+    compiled = _compile(mjml)
+    while True:
+        # ids are per URL across every version of the content, so edits never repoint an id
+        known: dict[str, int] = {}
+        for link_id, url in s.execute(select(CampaignLink.link_id, CampaignLink.url)
+                                      .where(CampaignLink.campaign_id == campaign_id).order_by(CampaignLink.link_id)):
+            known.setdefault(url, link_id)
+        html, links = rewrite_links(compiled, known=known)
+        rows = [{"campaign_id": campaign_id, "link_id": i, "url": u} for i, u in links.items() if u not in known]
+        if not rows:
+            break
+        try:
+            s.execute(insert(CampaignLink), rows)
+            s.commit()
+            break
+        except IntegrityError:
+            s.rollback()  # another worker took these ids first; re-read its links and allocate again
+    tpl = compile_template(html)
+    if len(_tpl_cache) >= HTML_CACHE_MAX:
+        _tpl_cache.pop(next(iter(_tpl_cache)))
+    _tpl_cache[key] = tpl
+    return tpl
+
+_limiters: dict[str, RateLimiter] = {}
+
+def _limiter(provider: str) -> RateLimiter:
+    if provider not in _limiters:
+        _limiters[provider] = RateLimiter(redis, provider, RATE_LIMITS)
+    return _limiters[provider]
+
+def _send_rows(campaign_id: int, tpl: CompiledTemplate, recipients) -> list[dict]:
+    """Send (contact_id, email, context) triples through the provider; returns email_send rows.
+
+    Recipients are grouped by domain and sent in slices sized by the tokens the
+    shared rate limiter grants; throttled messages back the limiter off and are
+    retried a few times before being recorded as failed. Addresses suppressed
+    since the snapshot are recorded as ``suppressed`` without a provider call.
+    """
+    provider = get_provider(EMAIL_PROVIDER)
+    limiter = _limiter(provider.name)
+    recipients, rows = split_suppressed(campaign_id, provider.name, recipients, suppressed)
+    for domain, rcpts in by_domain(recipients).items():
+        pending = [(rcpt, 0) for rcpt in rcpts]
+        while pending:
+            n = limiter.acquire(domain, len(pending))
+            part, pending = pending[:n], pending[n:]
+            results = provider.send_batch(Message(email, SUBJECT, tpl.source, template_data=ctx) for (_, email, ctx), _ in part)
+            if any(r.throttled for r in results):
+                limiter.penalize(domain)
+            for (rcpt, tries), r in zip(part, results):
+                if r.throttled and tries < THROTTLE_RETRIES:
+                    pending.append((rcpt, tries + 1))
+                    continue
+                rows.append(email_send_row(campaign_id, rcpt[0], provider.name, r))
+    return rows
+
+def _count(batch: list[dict]):
+    # progress counters move when rows actually land, once per campaign per flush
+    per_campaign: dict[int, dict[str, int]] = {}
+    for r in batch:
+        counts = per_campaign.setdefault(r["campaign_id"], {"sent": 0, "failed": 0, "suppressed": 0})
+        counts[r["status"]] += 1
+    for campaign_id, counts in per_campaign.items():
+        progress.record_sends(redis, campaign_id, **counts)
+    record(redis, len(batch))
+
+writer = ResultWriter(engine, max_rows=RESULT_FLUSH_ROWS, max_delay=RESULT_FLUSH_MS / 1000, on_flush=_count)
+
+_async_engine: AsyncSendEngine | None = None
+
+def _engine() -> AsyncSendEngine:
+    global _async_engine
+    if _async_engine is None:
+        provider = get_provider(EMAIL_PROVIDER)
+        _async_engine = AsyncSendEngine(DATABASE_URL, provider, _limiter(provider.name),
+                                        concurrency=SEND_CONCURRENCY, writer=writer, suppressed=suppressed)
+    return _async_engine
+
+def shutdown():
+    """Flush buffered results and release connections (called by the supervisor before a child exits)."""
+    writer.close()
+    if _async_engine is not None:
+        _async_engine.close()
+    engine.dispose()
+
+# One-off and per-contact sending tasks
+# (shipped into the worker image as app/tasks_worker.py, next to the backend app package)
+
+def send_transactional(to_email: str, subject: str, html: str, text: str | None = None):
+    # one-off message from the transactional queue; still counted against the provider's rate limit
+    provider = get_provider(EMAIL_PROVIDER)
+    _limiter(provider.name).acquire(to_email.rpartition("@")[2], 1)
+    return provider.send(to_email, subject, html, text)
+
+# per-contact jobs enqueued by earlier releases, still drained from the legacy ``send`` queue
 def send_one(campaign_id: int, contact_id: int):
     s = Session()
     try:
-        # Join template + contact
-        tpl = s.execute(text("""
-            SELECT t.mjml, c.email
-            FROM campaign AS ca
-            JOIN email_template t ON t.id = ca.template_id
-            JOIN contact c ON c.id = :cid
-            WHERE ca.id = :caid
-        """), {"cid": contact_id, "caid": campaign_id}).fetchone()
-        if not tpl:
+        mjml = s.execute(CAMPAIGN_CONTENT, {"caid": campaign_id}).scalar()
+        contact = s.get(Contact, contact_id)
+        if mjml is None or contact is None:
+            return
+        if s.execute(select(EmailSend.id).where(EmailSend.campaign_id == campaign_id, EmailSend.contact_id == contact_id)).first():
+            return  # already sent; a retried job must not send twice
+        recipient = s.get(CampaignRecipient, (campaign_id, contact_id))
+        token = recipient.token if recipient else ""
+        ctx = contact_context(contact.email, contact.attributes, contact.tags, token=token)
+        rows = _send_rows(campaign_id, _campaign_template(s, campaign_id, mjml), [(contact_id, contact.email, ctx)])
+        # Queue the email_send row on the write-behind buffer
+        writer.add(rows)
+    finally:
+        s.close()
+
+# Batched variant enqueued once per chunk by app.tasks.enqueue_batches: one content
+# lookup and compile, one contact query, results via the write-behind buffer. Large chunks run
+# on the asyncio engine with provider calls in flight concurrently. Contacts that already
+# have an email_send row are skipped, and the chunk's checkpoint cursor moves to its
+# last contact once the rows are written (``chunk`` is the checkpoint key on resumed jobs).
+
+def send_batch(campaign_id: int, contact_ids: list[int], chunk: int | None = None):
+    s = Session()
+    try:
+        mjml = s.execute(CAMPAIGN_CONTENT, {"caid": campaign_id}).scalar()
+        if mjml is None or not contact_ids:
+            return
+        lo, hi = contact_ids[0] if chunk is None else chunk, contact_ids[-1]
+        done = partial(checkpoints.advance, redis, campaign_id, lo, hi)
+        tpl = _campaign_template(s, campaign_id, mjml)
+        if len(contact_ids) >= ASYNC_SEND_MIN:
+            s.close()
+            _engine().run(campaign_id, list(contact_ids), tpl, SUBJECT, on_done=done)
             return
-        mjml, email = tpl
-        # Render via backend service (optional) or inline fallback
-        # Here we call backend (assuming api at http://api:8000) – you can switch to direct mjml render
-        r = requests.post("http://api:8000/render", json={"mjml": mjml, "vars": {"email": email}})
-        html = r.json()["html"] if r.ok else mjml
-
-        if EMAIL_PROVIDER == "ses":
-            ses = boto3.client("ses", region_name=AWS_REGION)
-            ses.send_email(Source="No Reply <no-reply@example.com>",
-                            Destination={"ToAddresses": [email]},
-                            Message={"Subject": {"Data": "Hello"},
-                                    "Body": {"Html": {"Data": html}}})
-        # Insert email_send row
-        s.execute(text("INSERT INTO email_send(campaign_id,contact_id,provider,status) VALUES(:ca,:co,:pr,:st)"),
-        {"ca": campaign_id, "co": contact_id, "pr": EMAIL_PROVIDER, "st": "sent"})
-        s.commit()
+        contacts = s.execute(
+            select(Contact.id, Contact.email, Contact.attributes, Contact.tags, CampaignRecipient.token)
+            .join(CampaignRecipient, (CampaignRecipient.contact_id == Contact.id) & (CampaignRecipient.campaign_id == campaign_id))
+            .where(Contact.id.in_(contact_ids), unsent(campaign_id))
+        ).all()
+        rows = _send_rows(campaign_id, tpl, (
+            (contact_id, email, contact_context(email, attrs, tags, token=token))
+            for contact_id, email, attrs, tags, token in contacts
+        ))
+        writer.add(rows, on_done=done)
     finally:
-        s.close()
\ No newline at end of file
+        s.close()